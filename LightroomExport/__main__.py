@@ -0,0 +1,6 @@
+import sys
+
+from LightroomExport.main import cli
+
+
+cli(sys.argv[1:])
@@ -0,0 +1,130 @@
+# Times the catalog reading and planning stages against synthetic catalogs of growing size.
+# python -m LightroomExport.benchmark --sizes 1000 10000 --baseline baseline.json [--record]
+
+import sqlite3
+from typing import Callable, List
+from os import path
+import os
+import sys
+import time
+import json
+import tempfile
+import tracemalloc
+import argparse
+import contextlib
+
+from LightroomExport import main
+from LightroomExport.synthetic_catalog import generate_catalog
+
+
+default_sizes = [1000, 5000, 20000]
+
+
+def run_benchmarks(sizes: List[int], repeat: int) -> dict:
+    results = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_folder:
+            catalog_path = path.join(work_folder, 'synthetic.lrcat')
+            catalog_summary = generate_catalog(catalog_path, photo_count=size, image_folder=work_folder)
+            results[str(size)] = benchmark_catalog(catalog_path, catalog_summary, repeat)
+
+    return results
+
+
+def benchmark_catalog(catalog_path: str, catalog_summary: dict, repeat: int) -> dict:
+    stage_results = {}
+
+    with sqlite3.connect(catalog_path) as db_connection:
+        stage_results['read_entities_with_parent'] = measure(lambda: main.read_entities_with_parent(None, db_connection), repeat)
+        stage_results['read_keyword_index'] = measure(lambda: main.read_keyword_index(db_connection), repeat)
+        keyword_index = main.read_keyword_index(db_connection)
+        stage_results['get_all_photo_details'] = measure(lambda: main.get_all_photo_details(db_connection, None, keyword_index), repeat)
+        rated_keyword_index = main.read_keyword_index(db_connection, {'minimum_rating': 5})
+        stage_results['get_all_photo_details rated 5'] = measure(
+            lambda: main.get_all_photo_details(db_connection, {'minimum_rating': 5}, rated_keyword_index), repeat)
+        photo_details = main.get_all_photo_details(db_connection, None, keyword_index)
+
+    stage_results['get_stack_details'] = measure(lambda: main.get_stack_details(photo_details), repeat)
+    stack_details = main.get_stack_details(photo_details)
+    stage_results['check_photo_files'] = measure(
+        lambda: main.check_photo_files(copy_photo_details(photo_details), stack_details, [catalog_summary['edits_folder']],
+                                       main.lighroom_edits_extensions),
+        repeat)
+    stage_results['generate_photo_metadata'] = measure(
+        lambda: generate_all_photo_metadata(copy_photo_details(photo_details), keyword_index), repeat)
+
+    return stage_results
+
+
+def copy_photo_details(photo_details: dict) -> dict:
+    # the stages below modify the photo details in place, give every run its own copy
+    return {photo_id: {**photo_info, 'albums': list(photo_info['albums'])}
+            for photo_id, photo_info in photo_details.items()}
+
+
+def generate_all_photo_metadata(photo_details: dict, keyword_index: dict):
+    for photo_info in photo_details.values():
+        photo_info['keywords'] = main.keyword_names_for_photo(photo_info, keyword_index)
+        main.generate_photo_metadata(photo_info)
+
+
+def measure(stage: Callable, repeat: int) -> dict:
+    timings = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stage()
+            timings.append(time.perf_counter() - start)
+
+        # tracing slows everything down, so memory gets its own run
+        tracemalloc.start()
+        try:
+            stage()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {'seconds': min(timings), 'peak_bytes': peak_bytes}
+
+
+def print_results(results: dict, baseline: dict):
+    for size, stage_results in results.items():
+        print('{} photos'.format(size))
+        for stage, stage_result in stage_results.items():
+            line = '    {:<32} {:>10.4f}s {:>10.1f}MiB'.format(stage, stage_result['seconds'], stage_result['peak_bytes'] / (1024 * 1024))
+            baseline_result = baseline.get(size, {}).get(stage)
+            if baseline_result is not None and baseline_result['seconds'] > 0:
+                line += '    {:>6.2f}x time {:>6.2f}x memory vs baseline'.format(
+                    stage_result['seconds'] / baseline_result['seconds'],
+                    stage_result['peak_bytes'] / baseline_result['peak_bytes'] if baseline_result['peak_bytes'] > 0 else 0.0)
+            print(line)
+
+
+def parse_arguments(arguments: List[str]):
+    parser = argparse.ArgumentParser(description='Benchmark the catalog stages against synthetic catalogs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='JSON file of earlier results to compare against')
+    parser.add_argument('--record', action='store_true', help='write these results to the baseline file')
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments(sys.argv[1:])
+    if arguments.record and arguments.baseline is None:
+        print('--record needs --baseline')
+        sys.exit(1)
+
+    baseline = {}
+    if arguments.baseline is not None and path.exists(arguments.baseline):
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = run_benchmarks(arguments.sizes, arguments.repeat)
+    print_results(results, baseline)
+
+    if arguments.record:
+        with open(arguments.baseline, 'w') as baseline_file:
+            json.dump({**baseline, **results}, baseline_file, indent=4)
+        print('Recorded baseline to {}'.format(arguments.baseline))
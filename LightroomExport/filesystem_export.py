@@ -0,0 +1,278 @@
+# Exports the catalog as a plain folder tree for an archival copy, no Photos involved so it runs anywhere.
+#
+# destination/Library/<root folder>/<path from root>/  every exported original and Lightroom edit, plus an XMP sidecar
+# destination/Albums/<folder>/<album>/                 the file Photos would get, once for every album the photo is in
+#
+# The files are hardlinks (or reflinks) of the originals, so nothing is actually copied.
+
+from typing import Optional, List, Tuple
+from xml.etree import ElementTree
+from os import path
+import os
+import sys
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from LightroomExport import main
+
+
+link_modes = ['hardlink', 'reflink', 'symlink', 'copy']
+export_workers = 8
+
+# the same ratings set_metadata_apple_script marks as favorites in Photos
+favorite_ratings = [4, 5]
+favorite_keyword = 'favorite'
+
+# from linux/fs.h
+FICLONE = 0x40049409
+
+xmp_namespaces = {
+    'x': 'adobe:ns:meta/',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'xmp': 'http://ns.adobe.com/xap/1.0/',
+    'exif': 'http://ns.adobe.com/exif/1.0/',
+    'tiff': 'http://ns.adobe.com/tiff/1.0/',
+    'photoshop': 'http://ns.adobe.com/photoshop/1.0/',
+    'lr': 'http://ns.adobe.com/lightroom/1.0/'
+}
+
+for xmp_prefix, xmp_uri in xmp_namespaces.items():
+    ElementTree.register_namespace(xmp_prefix, xmp_uri)
+
+
+def export_catalog(database_path, destination: str, edits_folders: List[str], edits_extensions: List[str], link_mode: str = 'hardlink',
+                   photo_filter: Optional[dict] = None, flatten_keywords: bool = False, workers: int = export_workers) -> bool:
+    entity_tree, photo_details, stack_details, keyword_index = main.load_catalog(database_path, photo_filter, flatten_keywords)
+
+    file_problems = main.check_photo_files(photo_details, stack_details, edits_folders, edits_extensions)
+    if len(file_problems) > 0:
+        for file_problem in file_problems:
+            print(file_problem)
+        print('{} file problem(s) found, not exporting'.format(len(file_problems)))
+        return False
+
+    export_plans = plan_exports(destination, entity_tree, photo_details, stack_details, keyword_index)
+
+    for folder in sorted({path.dirname(link[1]) for export_plan in export_plans for link in export_plan['links']}):
+        os.makedirs(folder, exist_ok=True)
+
+    export_problems = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for export_problem in executor.map(lambda export_plan: export_photo(export_plan, link_mode, flatten_keywords), export_plans):
+            if export_problem is not None:
+                export_problems.append(export_problem)
+
+    for export_problem in export_problems:
+        print(export_problem)
+    print('Exported {} photos to {} with {} problem(s)'.format(len(export_plans) - len(export_problems), destination, len(export_problems)))
+
+    return len(export_problems) == 0
+
+
+def plan_exports(destination: str, entity_tree: dict, photo_details: dict, stack_details: dict, keyword_index: dict) -> List[dict]:
+    # every name is picked here, up front and in catalog order, so the workers never race for a name and reruns pick the same ones
+    album_folders = get_album_folders(entity_tree, path.join(destination, 'Albums'))
+    library_folder = path.join(destination, 'Library')
+    taken_names = {}
+    export_plans = []
+
+    for photo_id, photo_info in photo_details.items():
+        original_file = photo_info['file']
+        if not main.prepare_photo_for_import(photo_id, photo_details, stack_details, keyword_index):
+            continue
+
+        photo_folder = path.join(library_folder, *[safe_name(part) for part in photo_info['folder'].split('/') if part != ''])
+        library_original = reserve_name(taken_names, photo_folder, path.basename(original_file), photo_id)
+        links = [(original_file, library_original)]
+
+        library_file = library_original
+        if photo_info['file'] != original_file:
+            library_file = reserve_name(taken_names, photo_folder, path.basename(photo_info['file']), photo_id)
+            links.append((photo_info['file'], library_file))
+
+        for album_id in photo_info['albums']:
+            album_folder = album_folders.get(album_id)
+            if album_folder is None:
+                continue  # the album was pruned by the filter, or is not a plain collection
+            links.append((library_file, reserve_name(taken_names, album_folder, path.basename(library_file), photo_id)))
+
+        export_plans.append({
+            'photo_id': photo_id,
+            'photo_info': photo_info,
+            'links': links
+        })
+
+    return export_plans
+
+
+def get_album_folders(entity_tree: dict, parent_folder: str) -> dict:
+    album_folders = {}
+    for key, item in entity_tree.items():
+        folder = path.join(parent_folder, safe_name(item['name']))
+        if item['type'] == 'com.adobe.ag.library.group':
+            album_folders.update(get_album_folders(item['children'], folder))
+        else:
+            album_folders[key] = folder
+
+    return album_folders
+
+
+def safe_name(name: str) -> str:
+    name = name.replace('/', '_').replace('\x00', '')
+    return '_' if name in ['', '.', '..'] else name
+
+
+def reserve_name(taken_names: dict, folder: str, file_name: str, photo_id: int) -> str:
+    # macOS paths are case insensitive, so Album/IMG_1.jpg and album/img_1.JPG would be the same file
+    folder_names = taken_names.setdefault(folder.lower(), set())
+    if file_name.lower() in folder_names:
+        stem, extension = path.splitext(file_name)
+        file_name = '{} ({}){}'.format(stem, photo_id, extension)
+    folder_names.add(file_name.lower())
+
+    return path.join(folder, file_name)
+
+
+def export_photo(export_plan: dict, link_mode: str, flatten_keywords: bool = False) -> Optional[str]:
+    photo_info = export_plan['photo_info']
+    try:
+        main.generate_photo_metadata(photo_info)
+        sidecar = generate_sidecar(photo_info, flatten_keywords)
+
+        for (source, destination) in export_plan['links']:
+            link_file(source, destination, link_mode)
+            write_sidecar(sidecar, destination + '.xmp')
+    except Exception as error:
+        return 'Failed to export {} ({}): {}'.format(export_plan['photo_id'], photo_info['file'], error)
+
+    return None
+
+
+def link_file(source: str, destination: str, link_mode: str):
+    if path.lexists(destination):
+        if link_mode == 'hardlink' and path.exists(destination) and path.samefile(source, destination):
+            return  # exported by an earlier run
+        os.remove(destination)
+
+    if link_mode == 'hardlink':
+        os.link(source, destination)
+    elif link_mode == 'reflink':
+        reflink_file(source, destination)
+    elif link_mode == 'symlink':
+        os.symlink(path.abspath(source), destination)
+    else:
+        shutil.copy2(source, destination)
+
+
+def reflink_file(source: str, destination: str):
+    if sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), destination)
+        return
+
+    import fcntl
+    try:
+        with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        if path.exists(destination):
+            os.remove(destination)
+        raise
+    shutil.copystat(source, destination)
+
+
+def write_sidecar(sidecar: bytes, sidecar_path: str):
+    with open(sidecar_path, 'wb') as sidecar_file:
+        sidecar_file.write(sidecar)
+
+
+def generate_sidecar(photo_info: dict, flatten_keywords: bool = False) -> bytes:
+    def tag(name: str) -> str:
+        prefix, local_name = name.split(':')
+        return '{{{}}}{}'.format(xmp_namespaces[prefix], local_name)
+
+    xmpmeta = ElementTree.Element(tag('x:xmpmeta'))
+    rdf = ElementTree.SubElement(xmpmeta, tag('rdf:RDF'))
+    description = ElementTree.SubElement(rdf, tag('rdf:Description'), {tag('rdf:about'): ''})
+
+    if photo_info['name'] is not None:
+        title = ElementTree.SubElement(ElementTree.SubElement(description, tag('dc:title')), tag('rdf:Alt'))
+        ElementTree.SubElement(title, tag('rdf:li'), {'{http://www.w3.org/XML/1998/namespace}lang': 'x-default'}).text = photo_info['name']
+
+    date_time = format_xmp_datetime(photo_info.get('datetime_photos', None), photo_info.get('timezone', None))
+    if date_time is not None:
+        ElementTree.SubElement(description, tag('exif:DateTimeOriginal')).text = date_time
+        ElementTree.SubElement(description, tag('photoshop:DateCreated')).text = date_time
+
+    if photo_info['rating'] is not None:
+        ElementTree.SubElement(description, tag('xmp:Rating')).text = str(photo_info['rating'])
+
+    if photo_info['orientation'] in main.lightroom_to_exif_orientation:
+        ElementTree.SubElement(description, tag('tiff:Orientation')).text = str(main.lightroom_to_exif_orientation[photo_info['orientation']])
+
+    if photo_info['latitude'] is not None and photo_info['longitude'] is not None:
+        ElementTree.SubElement(description, tag('exif:GPSLatitude')).text = format_xmp_gps(photo_info['latitude'], 'N', 'S')
+        ElementTree.SubElement(description, tag('exif:GPSLongitude')).text = format_xmp_gps(photo_info['longitude'], 'E', 'W')
+
+    # XMP has no favorite flag and xmp:Label is already the color label, so favorites get a keyword to search for
+    photo_keywords = list(photo_info['keywords'])
+    if photo_info['rating'] in favorite_ratings and favorite_keyword not in photo_keywords:
+        photo_keywords.append(favorite_keyword)
+
+    keywords, hierarchical_keywords = split_hierarchical_keywords(photo_keywords, flatten_keywords)
+    if len(keywords) > 0:
+        subject = ElementTree.SubElement(ElementTree.SubElement(description, tag('dc:subject')), tag('rdf:Bag'))
+        for keyword in keywords:
+            ElementTree.SubElement(subject, tag('rdf:li')).text = keyword
+    if len(hierarchical_keywords) > 0:
+        hierarchical_subject = ElementTree.SubElement(ElementTree.SubElement(description, tag('lr:hierarchicalSubject')), tag('rdf:Bag'))
+        for keyword in hierarchical_keywords:
+            ElementTree.SubElement(hierarchical_subject, tag('rdf:li')).text = keyword
+
+    return ElementTree.tostring(xmpmeta, encoding='utf-8')
+
+
+def format_xmp_datetime(date_time, timezone: Optional[str]) -> Optional[str]:
+    if date_time is None:
+        return None
+
+    if timezone is None:
+        return date_time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    import pendulum
+    return pendulum.instance(date_time, tz=timezone).isoformat()
+
+
+def format_xmp_gps(coordinate: float, positive_reference: str, negative_reference: str) -> str:
+    reference = positive_reference if coordinate >= 0 else negative_reference
+    coordinate = abs(coordinate)
+    degrees = int(coordinate)
+
+    return '{},{:.6f}{}'.format(degrees, (coordinate - degrees) * 60, reference)
+
+
+def split_hierarchical_keywords(keywords: List[str], flatten_keywords: bool = False) -> Tuple[List[str], List[str]]:
+    # with --flatten-keywords a keyword is Places|Europe|Paris, which Lightroom keeps in lr:hierarchicalSubject with Paris in dc:subject.
+    # Top level keywords go in the hierarchy too, or Lightroom would think they were removed from it
+    flat_keywords = []
+    hierarchical_keywords = []
+    for keyword in keywords:
+        if flatten_keywords:
+            if keyword not in hierarchical_keywords:
+                hierarchical_keywords.append(keyword)
+            keyword = keyword.split(main.keyword_separator)[-1]
+        if keyword not in flat_keywords:
+            flat_keywords.append(keyword)
+
+    return flat_keywords, hierarchical_keywords
+
+
+def add_export_arguments(parser):
+    parser.add_argument('destination')
+    parser.add_argument('--link-mode', choices=link_modes, default='hardlink',
+                        help='hardlink and reflink do not copy anything, but need the destination on the same volume')
+    parser.add_argument('--workers', type=int, default=export_workers)
@@ -10,55 +10,109 @@
 
 import sqlite3
 from typing import Optional, List, Tuple
-import applescript
 from xml.etree import ElementTree
 import datetime
 import exifread
 from os import path
 import os
 import sys
-from timezonefinder import TimezoneFinder
 import time
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+from array import array
+import threading
 
 
-tf = TimezoneFinder()
+# applescript (PyObjC) and TimezoneFinder are slow to load and applescript only exists on macOS, so neither is touched
+# until a command actually needs Photos or a timezone lookup
+timezone_finder = None
+timezone_finder_lock = threading.Lock()
+timezone_lookup_lock = threading.Lock()
 
 
-create_album_apple_script_root = applescript.AppleScript("""on run album_name
+def get_timezone_finder():
+    global timezone_finder
+    with timezone_finder_lock:
+        if timezone_finder is None:
+            from timezonefinder import TimezoneFinder
+            timezone_finder = TimezoneFinder()
+
+    return timezone_finder
+
+
+def lookup_timezone(latitude: float, longitude: float) -> Optional[str]:
+    finder = get_timezone_finder()
+    # TimezoneFinder seeks around in file handles every lookup shares, so lookups from worker threads have to take turns
+    with timezone_lookup_lock:
+        return finder.timezone_at(lat=latitude, lng=longitude)
+
+
+class LazyAppleScript:
+    def __init__(self, source: str):
+        self.source = source
+        self.script = None
+
+    def run(self, *args):
+        if self.script is None:
+            import applescript
+            self.script = applescript.AppleScript(self.source)
+
+        return self.script.run(*args)
+
+
+def photos_id_from_result(result) -> str:
+    import applescript
+    return result[applescript.AEType(b'seld')]
+
+
+# these reuse a folder or album of the same name made by an earlier (filtered) run, so the migration can be done in waves
+create_album_apple_script_root = LazyAppleScript("""on run album_name
                                                 tell application "Photos"
+                                                    set existing_albums to (albums whose name is album_name)
+                                                    if (count of existing_albums) > 0 then
+                                                        return item 1 of existing_albums
+                                                    end if
                                                     make new album named album_name
                                                 end tell
                                             end run""")
 
-create_album_apple_script = applescript.AppleScript("""on run {album_name, parent_name}
+create_album_apple_script = LazyAppleScript("""on run {album_name, parent_name}
                                                 tell application "Photos"
                                                     set parent_folder to folder named parent_name
+                                                    set existing_albums to (albums of parent_folder whose name is album_name)
+                                                    if (count of existing_albums) > 0 then
+                                                        return item 1 of existing_albums
+                                                    end if
                                                     make new album named album_name at parent_folder
                                                 end tell
                                             end run""")
 
-create_folder_apple_script_root = applescript.AppleScript("""on run folder_name
+create_folder_apple_script_root = LazyAppleScript("""on run folder_name
                                                 tell application "Photos"
-                                                    make new folder named folder_name
+                                                    if (count of (folders whose name is folder_name)) is 0 then
+                                                        make new folder named folder_name
+                                                    end if
                                                 end tell
                                             end run""")
 
-create_folder_apple_script = applescript.AppleScript("""on run {folder_name, parent_name}
+create_folder_apple_script = LazyAppleScript("""on run {folder_name, parent_name}
                                                 tell application "Photos"
                                                     set parent_folder to folder named parent_name
-                                                    make new folder named folder_name at parent_folder
+                                                    if (count of (folders of parent_folder whose name is folder_name)) is 0 then
+                                                        make new folder named folder_name at parent_folder
+                                                    end if
                                                 end tell
                                             end run""")
 
-import_photo_apple_script = applescript.AppleScript("""on run photo_path
+import_photo_apple_script = LazyAppleScript("""on run photo_path
                                               tell application "Photos"
                                                   import photo_path skip check duplicates true
                                               end tell
                                           end run""")
 
-set_metadata_apple_script = applescript.AppleScript("""on run {photo_id, photo_name, date_time, rating, latitude, longitude, photo_keywords}
+set_metadata_apple_script = LazyAppleScript("""on run {photo_id, photo_name, date_time, rating, latitude, longitude, photo_keywords}
                                                        tell application "Photos"
                                                            if photo_name is not current application then
                                                                set name of media item id photo_id to photo_name
@@ -76,33 +130,33 @@ set_metadata_apple_script = applescript.AppleScript("""on run {photo_id, photo_n
                                                        end tell
                                                    end run""")
 
-assign_album_apple_script = applescript.AppleScript("""on run {photo_id, album_id}
+assign_album_apple_script = LazyAppleScript("""on run {photo_id, album_id}
                                                            tell application "Photos"
                                                                add {media item id photo_id} to album id album_id
                                                            end tell
                                                        end run""")
 
 
-quit_photos_apple_script = applescript.AppleScript("""tell application "Photos"
+quit_photos_apple_script = LazyAppleScript("""tell application "Photos"
                                                            quit
                                                        end tell""")
 
 
-start_photos_apple_script = applescript.AppleScript("""tell application "Photos"
+start_photos_apple_script = LazyAppleScript("""tell application "Photos"
                                                            activate
                                                        end tell""")
 
-get_photos_selection_apple_script = applescript.AppleScript("""tell application "Photos"
+get_photos_selection_apple_script = LazyAppleScript("""tell application "Photos"
     get selection
 end tell""")
 
-get_photos_date_for_id_apple_script = applescript.AppleScript("""on run {photo_id}
+get_photos_date_for_id_apple_script = LazyAppleScript("""on run {photo_id}
 tell application "Photos"
     date of media item id photo_id
 end tell
 end run""")
 
-go_down_selection_photos_apple_script = applescript.AppleScript("""tell application "Photos"
+go_down_selection_photos_apple_script = LazyAppleScript("""tell application "Photos"
     activate
 end tell
 
@@ -113,7 +167,7 @@ tell application "System Events"
 end tell
 """)
 
-change_timezone_photos_apple_script = applescript.AppleScript("""on chooseMenuItem(theAppName, theMenuName, theMenuItemName)
+change_timezone_photos_apple_script = LazyAppleScript("""on chooseMenuItem(theAppName, theMenuName, theMenuItemName)
     try
         tell application theAppName
             activate
@@ -226,6 +280,19 @@ end run
 
 
 lighroom_edits_folder = '/Users/someone/Pictures/Lightroom/Edits/Real Edits/'
+lighroom_edits_folders = [lighroom_edits_folder]
+lighroom_edits_extensions = ['tif']
+file_check_workers = 16
+
+keyword_exclusions = ['Aperture Stack ']
+keyword_separator = '|'
+
+lightroom_to_exif_orientation = {
+    'AB': 1,
+    'BC': 6,
+    'CD': 3,
+    'DA': 8
+}
 
 
 timezone_to_apple_closest_city = {
@@ -277,25 +344,119 @@ apple_closest_city_to_timezone = {
 try_again_timezone = {'Y7nEt4KiSvuTdGl%YLNdsA': 'New York, NY - United States', '4g5kjFC+QneKs45XsLjVbA': 'New York, NY - United States', 'udSditqNRIuU6KWTKR3tUA': 'New York, NY - United States', 'hpKf5wfeQXOJgzjOBU5WeA': 'New York, NY - United States', 'h1PceF4yRzC+FUW+rVrjjQ': 'New York, NY - United States', 'Qe3pIZ92QryY%maWlzrBpA': 'New York, NY - United States', 'tguCfF+XRP+v4ftVxa3ouQ': 'New York, NY - United States', 'OCsyi9oRR%SLV9leF1RG%Q': 'Los Angeles, CA - United States', 'K5nuUa1rQGKzHBbBF0eCtA': 'New York, NY - United States', 'FoDlxVrCSB6waz+4HIAQBg': 'New York, NY - United States', 't7zk87fvQ92FYAyMmgxaRA': 'New York, NY - United States', 'MTGN3cuISe6AbqfUKg%ArA': 'New York, NY - United States', 'UVRQh0cgQiWWkNIqe2e1Qg': 'New York, NY - United States', 'r4i9X7AFSbauxCh3jP9yXg': 'New York, NY - United States', 'gX+Ig1NbTAqbAcOVqEbXDQ': 'New York, NY - United States', 'sWcR%TsEQQ6ihQy1lBAmGg': 'New York, NY - United States', 'i6FPoNzJR8SXgg5FmK5fOg': 'New York, NY - United States', 'fDMwBxkQRDqAcTYmPY8PmQ': 'New York, NY - United States', 'hBkTBBbJShm8RvScqTHrmQ': 'New York, NY - United States', 'MmJXdLFiTeyhelu2+Ep05g': 'New York, NY - United States', 'A4beH8KOSpCkapYAXQlVwQ': 'New York, NY - United States', 'vyQSsaXGSAy7FdAOXLQewA': 'New York, NY - United States', 'D3bg3mk6SGa1m2jJ1E26yg': 'New York, NY - United States', 'q5+a%s0RQjauB2xHaqZU4w': 'New York, NY - United States', 'AxqILHYJSbSfu19DNCILfA': 'Los Angeles, CA - United States', 'icCz06WWTrqnDYn94k1QbQ': 'New York, NY - United States', 'RIeBnFTdT%iIFmNSOqs3gg': 'New York, NY - United States', 'fqjcJIe7T6WkMB90WHXXPw': 'New York, NY - United States', 'D%eVoqx9Ro+VaYXvrhYtvw': 'Los Angeles, CA - United States', '1ESLoCKdR12eklcWeEGDrw': 'New York, NY - United States', 'TChj02VWRa6A0rt+jPAjWA': 'New York, NY - United States', 'nCgLVcXtRfW%lDnCqaglZQ': 'New York, NY - United States', 'wQfSFwU0SlKNhbyjwgZDfQ': 'New York, NY - United States', 'K4dR97OiRraAxW62NzUCXw': 'New York, NY - United States', 'gpfP5m%vQ8OLqMnPOStXBQ': 'New York, NY - United States', '++hjNHTVS4qID3hUjsSttw': 'Los Angeles, CA - United States', 'L92hZsakSCyCB1gD6qyunw': 'Los Angeles, CA - United States', 'uvFYodwaQme45AbRgAULpg': 'New York, NY - United States', 'qwXpFathTx+bJNQumZ3xVg': 'New York, NY - United States', 'nRUd9DRaR96c66Nak2hRsQ': 'New York, NY - United States', 'HIpmHaJBQGSiqV3kJahBww': 'New York, NY - United States', '2YyTahpBQViC8vHd15WcBQ': 'New York, NY - United States', 'zxQu86uRSAOJR6H2S04kNQ': 'New York, NY - United States', '5fPjbV7CSFGkGa+xQ0v9%Q': 'New York, NY - United States', 'Kza2SAqSSq6%C00sP4Zt3w': 'New York, NY - United States', 'lnTj5KuYTvmy4GFIjPFczA': 'New York, NY - United States', '8e%Bik98S8WLUuU7AZxkJg': 'New York, NY - United States', '0Od2f5StSDimPoapRhWUZw': 'Los Angeles, CA - United States', 'K5C1GMi+SFq2mji40QePjg': 'New York, NY - United States', '35NjiCPdS7mnDrZi0w27ag': 'New York, NY - United States', 'FhJWotPtSbeVxg7Z4GEwlw': 'New York, NY - United States', 'XdLB+DcUS1mvSDu9bLhlKg': 'New York, NY - United States', 'UTGDkqCsSlu6aF+Fj4ng8g': 'New York, NY - United States', 'HU3qcGQ7Rly9CA%U%Af8Rg': 'New York, NY - United States', 'ol8zkbXuRZauSM2iZIEt9g': 'New York, NY - United States', 'gd+t8dkgTQSLGkg+G%bCMw': 'New York, NY - United States', 'MQBo1KQjR3+fVboTDo0hEg': 'New York, NY - United States', '7MEVkq3FTSGiW9Jh+mopVw': 'New York, NY - United States', '%wwOZrErTnykByuTfUYKOw': 'New York, NY - United States', 'UtfPwzQeTAKT2AlJemk9uQ': 'New York, NY - United States', '725VY3mbSqaIh8AB0JknFQ': 'New York, NY - United States', 'xpGPQwkmQDi+ObJgh5A7Ow': 'New York, NY - United States', 'GxPjXcCMSlSRB6ufToWIZg': 'New York, NY - United States', '2TZyXSd6TAenP0k%2hwZeA': 'New York, NY - United States', '99rooSZvQGmuQFXoNNE3BQ': 'New York, NY - United States', 'ntxBegrdSBOv0949U9r+Xw': 'New York, NY - United States', 'kwE2gz2ET7mgjditvBDNWw': 'New York, NY - United States', 'fUOi6qRbTZGD+ynYRAd0bw': 'New York, NY - United States', 'xNrxvdbdT8iVAL4T2mKRNg': 'New York, NY - United States', 'YN5JFhPnRT2P70NLu40sCw': 'New York, NY - United States', 'XvVJyagWTIuEk981HViXrg': 'New York, NY - United States', 'wj6oeWKRQ8G3OzW0oTrUDQ': 'Los Angeles, CA - United States', 'CG4fXCJySqOl%O6MLMVM6g': 'New York, NY - United States', 'iORj%AlMQnGEIunBkilgOg': 'Los Angeles, CA - United States', 'qoKy1bcNRF+GA0mOHePPzg': 'Los Angeles, CA - United States', 'gCC9IDkJTgGx3PomndBAqg': 'Los Angeles, CA - United States', 'IrQXqOygQP+e%BEbwX95uQ': 'New York, NY - United States', '3RJ3sOJ7SPOUzb8YrbwPIQ': 'New York, NY - United States', 'it4caC53T8qrylx6n04r5Q': 'New York, NY - United States', 'YqurQ9kxSPS49Kd1fuXqFg': 'New York, NY - United States', '75WNVWk7TsiSYG3jwmhhQA': 'New York, NY - United States', 'lNAACZ7fSvCaB8ht2gcTqw': 'New York, NY - United States', 'y7eizhvZREOwp6%I5+nVRA': 'New York, NY - United States', 'dYjMvgSeS66eFLG9wcG5yA': 'New York, NY - United States', 'RjEwPGztTiC8Xzes7z2n7Q': 'New York, NY - United States', '3rcc7LpfQweV5e5c0am23g': 'New York, NY - United States', 'rs89vvEqTDCAanDW9r1A%w': 'New York, NY - United States', 'v+rbWUKuTIq2je1V0miS2w': 'New York, NY - United States', 'itnQLpBKSI6oY8H0Z3xuXw': 'New York, NY - United States', '4b61x9FCQoeYqSXK5cYgmw': 'New York, NY - United States', 'z6+sgAeqSkil8eoOWspU3w': 'New York, NY - United States', 'Is%u44KsTCqgBp0I0nUzgw': 'New York, NY - United States', 'tW52cXShQhWMUBS6cc+5zQ': 'New York, NY - United States', 'n7Zw3XRPT1WFlnDbau0uOw': 'New York, NY - United States', 'yxvVyJZuSZ+3gioYqnp+wQ': 'New York, NY - United States', '+dWH4Rs%T560LDGpMXT%Zg': 'New York, NY - United States', 'taw2Xc0eT7C9iCf0o5THCQ': 'New York, NY - United States', 'EPJB3TXsSDSO4ey50VqTzw': 'New York, NY - United States', '3v9AISuHRz69NQe71DL38A': 'New York, NY - United States', 'sOIxZPluQ7qtvoi1lWsJZg': 'New York, NY - United States', 'c5KCOyBNQ1+pblMu4zYl7w': 'New York, NY - United States', 'LY26eIi0TgKRyddTV6m7FA': 'Los Angeles, CA - United States', 'sS1xXlNcTuu1lz5IdSgfzA': 'New York, NY - United States', '75nG1YCjTpSIhbFFDs7Ssw': 'New York, NY - United States', 'kZ6jx2FbSweBlg77BbXJ1g': 'New York, NY - United States', 'BdT3n4ckQS+1UK14+z1NtA': 'New York, NY - United States', 'RlSFWGWWTl6pzHmZO2O7LA': 'New York, NY - United States', 'We+K2xFES%WUzs7TPoHPZQ': 'New York, NY - United States', 'XAAEr8drQDOtFueVhlKEtg': 'New York, NY - United States', 'v7tDRkIZQM27Fe0iZ0ZyLg': 'New York, NY - United States', 'KR%PMTVJTyek%XiZdae80w': 'New York, NY - United States', 'u14Bz2qLSsGjoAXrIm4eRg': 'Los Angeles, CA - United States', 'rxDmZ%OeREKr2gvOdTnOog': 'New York, NY - United States', 'sZzNAix7QcKc3JfyavsFtQ': 'New York, NY - United States', 'T9p+ePu0SKieeOpGRDKQ2g': 'New York, NY - United States', 'foqkd5EYTUStVOL2f+OVYQ': 'New York, NY - United States', 'MRD8jnmGQhK1glmEOBNDNg': 'New York, NY - United States', 'G%va1Le4ROSsQxqKGKhc+A': 'New York, NY - United States', 'kvJQHkpfQZG+7vc6tNYv4A': 'New York, NY - United States', 'lEUgq3R6TeCM1qFqTnJgdg': 'New York, NY - United States', 'syzpa38MTNWFkVgttYP0iw': 'New York, NY - United States', 'WPJdKiGxRrieMFso05+30A': 'New York, NY - United States', 'WhN%Kux8SlKHvyeC0%SHQw': 'New York, NY - United States', 'g+A6Il4+Qk+LiQgNbf4dQA': 'New York, NY - United States', 'hQrsOOQKQTSWUCXVOvMoEw': 'New York, NY - United States', 'bpup%m25TneguBS3Ilslfw': 'New York, NY - United States', 'hUzXcwExSy28sTPg7CcygQ': 'New York, NY - United States', 'Kk2DeVEjQNKALoKoh3FDIQ': 'New York, NY - United States', '5TM6NvE9RHKHdfAYYJMn0A': 'New York, NY - United States', 'ZChWQ90US76%XGFkuscYXA': 'New York, NY - United States', 'd9r1z%uLSlSzf%0byhmiWA': 'New York, NY - United States', 'ED08VaRyR%S7KFVjKGGDXw': 'New York, NY - United States', 'DJYo3hfvQEKPAhkk+chSEg': 'New York, NY - United States', 'BLv3ZKXnRR+xzlm4TGm4OQ': 'New York, NY - United States', '8U2NIJ8LSAuUAAWmOp8ELg': 'New York, NY - United States', 'DBsksqZrRRiPFNLgkIKCLg': 'New York, NY - United States', 'OUE2L440RDCDQCr2Lg4ZGA': 'New York, NY - United States', 'My2qEU4OTpecH%XezYcVuQ': 'New York, NY - United States', 'CgOFMPsgS4OcGBJpxddvrQ': 'New York, NY - United States', '4aLJyhpNQC+GHw7Cb58rwg': 'New York, NY - United States', '2riu8TXhR72DMmKVTqMhbg': 'New York, NY - United States', 'qKSTVZc7S3GAZHtj0U6uzQ': 'New York, NY - United States', 'NDZukFC9RgOCXSlgiWg%8w': 'New York, NY - United States', '1dW2v2axRdmV2I5q38L%5Q': 'New York, NY - United States', 'x1cgK466Rxq5E499OC4pHQ': 'Los Angeles, CA - United States', 'zNZIYW9mRQuyyty96LyDRg': 'New York, NY - United States', '%wwKCXRvRz69C2zS94%xtg': 'New York, NY - United States', 'H2bXlhyyTkOR4jdgA+0ecA': 'New York, NY - United States', '28hcoUj+Qhux8pqg8oRWsQ': 'New York, NY - United States', 'FHo4Ss6MSpyfr6sZkyh6HQ': 'New York, NY - United States', '%Om0ky4zQsOY1xM02uxrrg': 'New York, NY - United States', 'CmPh1ClAQ5uC0aW0tG2Zbg': 'New York, NY - United States', 'eTIxp7lNREuz0PlIvgVFIg': 'New York, NY - United States', 'TOM+qZKBQSaGxnRWXWFYfg': 'New York, NY - United States', 'Hw+0zmQrRiezg1XqJCzTag': 'Los Angeles, CA - United States', 'oLMCzjjmR5eBql2JjdlJjQ': 'New York, NY - United States', 'x9kAaRjJQR+HDdMvnfGfdw': 'New York, NY - United States', 'oh8PF78VQymYlOMiJYWf+w': 'New York, NY - United States', 'rdOi5s9nR0OJRzYfQUn4OA': 'New York, NY - United States', 'NJJHtz+ZSA+N2izDI9XBzA': 'New York, NY - United States', 'nK+DDUhzR7W65sKntTZmOg': 'New York, NY - United States', 'Rkt%aOv5T9KNZyZpLQE0fg': 'New York, NY - United States', 'E63TS+DiRjOuvX2rYiYHoA': 'New York, NY - United States', 'mnr6HQOCTIuyXRyIeZO3xA': 'New York, NY - United States', 'RdizV3rFTBORgXcD3VTrTg': 'New York, NY - United States', 'gLDU+D3ATAGFLbhAlikHfw': 'New York, NY - United States', 'gwHxn3kMTj66R4SIqHkVVA': 'New York, NY - United States', '25Bi81MMTuakFzy50olR6Q': 'New York, NY - United States', 'HQHeNTSVR1eGQanjdrYqQg': 'New York, NY - United States', 'Ppk+yTz%TmaATIGbgjraOA': 'New York, NY - United States', 'nFpF3XquRey0ES8wXfARFg': 'New York, NY - United States', 'YsigAx0yRl2B8ED+nTd%nQ': 'New York, NY - United States', '6fOV7QwlRFGTAHNKwZ1Uhw': 'New York, NY - United States', '9bSbh3r5TXKgDrJ%5O025A': 'New York, NY - United States', 'KWmpFSLvQO2MoXAudCFlAg': 'New York, NY - United States', 'LyHaAnuVQbOgEOewk46kuw': 'New York, NY - United States', 'PGQFChsAShW6FtY7VrTQOw': 'New York, NY - United States', '7+NNQE6GSyKhBb4jq+GhbA': 'New York, NY - United States', '3zelYhPdRFCp4dAijge3AQ': 'New York, NY - United States', 'kdXT4QDaS7GPXHKjTyNK7A': 'New York, NY - United States', '7hVeNtSJTBmTm%iDeyTsug': 'New York, NY - United States', 'Un4LFCTfSk6a+UNNMOnUFQ': 'Los Angeles, CA - United States', 'JzJAMSrVQ92eWSzL2t2Xxw': 'New York, NY - United States', 'EzsRZ5C0TXGuC+ty5VP76A': 'New York, NY - United States', 'lsp9N8R8RRizj9ibG8Pnbg': 'New York, NY - United States', 'Dy%+6yimTW+svvJns67PgA': 'Los Angeles, CA - United States', 'b09jGoTVRRyMsBrBVKG4GQ': 'Chicago, IL - United States', '4oBD23cuTp6hs4yyD4v5hA': 'Chicago, IL - United States', 'eT7ezrnJT2KLWfop3ZwmVw': 'Mexico City - Mexico', 'Oaw6y3nwSKmpBEnfVCUkOg': 'Los Angeles, CA - United States', '%BtH2x8WTIiD0XPVTsuTlQ': 'Los Angeles, CA - United States', 'QqjQtWn8RA69p8dRydClyg': 'Los Angeles, CA - United States', 'zI7rGbV8S5+d+kV+YcSPeA': 'Los Angeles, CA - United States', 'kWdQXEnHQn2VhR1%1oZeEg': 'Los Angeles, CA - United States', 'LUqa9KmOQ2WYXmoqZIPzmA': 'Los Angeles, CA - United States', '6xmfxt3SQ7iFZV4EIRq4Kw': 'Los Angeles, CA - United States', 'VwemA%clReug8NCRA0WagQ': 'Los Angeles, CA - United States', 'vbhpKCohQKyXCAPkXrMxNA': 'Los Angeles, CA - United States', 'chJ67OC+QQmmxDwYiLAHhg': 'Los Angeles, CA - United States'}
 
 
-def main(database_path):
-    entity_tree = {}
-    photo_details = {}
+def main(database_path, edits_folders: Optional[List[str]] = None, edits_extensions: Optional[List[str]] = None,
+         photo_filter: Optional[dict] = None, flatten_keywords: bool = False):
+    entity_tree, photo_details, stack_details, keyword_index = load_catalog(database_path, photo_filter, flatten_keywords)
 
-    with sqlite3.connect(database_path) as db_connection:
-        entity_tree = read_entities_with_parent(None, db_connection)
-        photo_details = get_all_photo_details(db_connection)
-    stack_details = get_stack_details(photo_details)
+    file_problems = check_photo_files(photo_details, stack_details, edits_folders or lighroom_edits_folders,
+                                      edits_extensions or lighroom_edits_extensions)
+    if len(file_problems) > 0:
+        for file_problem in file_problems:
+            print(file_problem)
+        print('{} file problem(s) found, not migrating'.format(len(file_problems)))
+        return
 
     start_photos_apple_script.run()
 
     album_conversion = create_entities_in_photos(entity_tree)
-    import_photos(photo_details, album_conversion, stack_details)
+    import_photos(photo_details, album_conversion, stack_details, keyword_index)
 
     # print(json.dumps(entity_tree, indent=4))
     set_timezone('America/Denver')
     print('Done')
 
 
+def load_catalog(database_path, photo_filter: Optional[dict] = None, flatten_keywords: bool = False) -> Tuple[dict, dict, dict, dict]:
+    with sqlite3.connect(database_path) as db_connection:
+        keyword_index = read_keyword_index(db_connection, photo_filter, flatten_keywords)
+        photo_details = get_all_photo_details(db_connection, photo_filter, keyword_index)
+        # the rest of a selected photo's stack decides whether it is skipped for Aperture edits and which albums it gets
+        stack_companions = get_stack_companion_details(db_connection, photo_details) if photo_filter else None
+        stack_details = get_stack_details(photo_details, stack_companions)
+        # with a filter, only bring over the albums (and the folders holding them) that the selected photos will be in
+        album_ids = get_selected_album_ids(photo_details, stack_details) if photo_filter else None
+        entity_tree = read_entities_with_parent(None, db_connection, album_ids)
+
+    return entity_tree, photo_details, stack_details, keyword_index
+
+
+def plan(database_path, edits_folders: List[str], edits_extensions: List[str], photo_filter: Optional[dict] = None,
+         flatten_keywords: bool = False):
+    entity_tree, photo_details, stack_details, keyword_index = load_catalog(database_path, photo_filter, flatten_keywords)
+    file_problems = resolve_edited_files(get_importable_photo_details(photo_details, stack_details),
+                                         build_edits_index(edits_folders, edits_extensions))
+
+    print_entity_tree(entity_tree, 0)
+
+    album_names = get_album_names(entity_tree)
+    for photo_id, photo_info in photo_details.items():
+        if not prepare_photo_for_import(photo_id, photo_details, stack_details, keyword_index):
+            continue
+        photo_album_names = [album_names[album_id] for album_id in photo_info['albums'] if album_id in album_names]
+        print('Import {} ({}) into {} with keywords {}'.format(photo_info['file'], photo_info['name'], photo_album_names,
+                                                               photo_info['keywords']))
+
+    for file_problem in file_problems:
+        print(file_problem)
+
+
+def print_entity_tree(entity_tree: dict, depth: int):
+    for item in entity_tree.values():
+        if item['type'] == 'com.adobe.ag.library.group':
+            print('{}Folder {}'.format('    ' * depth, item['name']))
+            print_entity_tree(item['children'], depth + 1)
+        else:
+            print('{}Album {}'.format('    ' * depth, item['name']))
+
+
+def get_album_names(entity_tree: dict) -> dict:
+    album_names = {}
+    for key, item in entity_tree.items():
+        if item['type'] == 'com.adobe.ag.library.group':
+            album_names.update(get_album_names(item['children']))
+        else:
+            album_names[key] = item['name']
+
+    return album_names
+
+
+def stats(database_path, photo_filter: Optional[dict] = None, flatten_keywords: bool = False):
+    entity_tree, photo_details, stack_details, keyword_index = load_catalog(database_path, photo_filter, flatten_keywords)
+
+    album_names = get_album_names(entity_tree)
+    aperture_skips = [photo_id for photo_id, photo_info in photo_details.items()
+                      if photo_paired_with_aperture_software_edits(photo_id, photo_info['stack'], stack_details)]
+    keywords = {keyword_index['export_names'][keyword] for keyword, photo_ids in keyword_index['keyword_photos'].items()
+                if any(photo_id in photo_details for photo_id in photo_ids)}
+    timezone_keywords = {keyword_index['export_names'][keyword] for keyword in keyword_index['timezone_keywords']
+                         if any(photo_id in photo_details for photo_id in keyword_index['keyword_photos'].get(keyword, []))}
+
+    print('Photos: {}'.format(len(photo_details)))
+    print('Photos to import: {}'.format(len(photo_details) - len(aperture_skips)))
+    print('Photos skipped for Aperture edits: {}'.format(len(aperture_skips)))
+    print('Photos with Lightroom edits: {}'.format(sum(1 for photo_info in photo_details.values() if photo_info['edits'] is True)))
+    print('Photos without an album: {}'.format(sum(1 for photo_info in photo_details.values() if len(photo_info['albums']) == 0)))
+    print('Photos with GPS: {}'.format(sum(1 for photo_info in photo_details.values()
+                                           if photo_info['latitude'] is not None and photo_info['longitude'] is not None)))
+    print('Stacks: {}'.format(len(stack_details)))
+    print('Albums: {}'.format(len(album_names)))
+    print('Keywords: {}'.format(len(keywords)))
+    print('Timezone keywords: {}'.format(sorted(timezone_keywords)))
+    print('Photos with multiple timezone keywords: {}'.format(sum(1 for photo_info in photo_details.values()
+                                                                  if photo_info['multiple_timezone_keywords'])))
+
+
+def verify(database_path, edits_folders: List[str], edits_extensions: List[str], photo_filter: Optional[dict] = None) -> bool:
+    _, photo_details, stack_details, _ = load_catalog(database_path, photo_filter)
+
+    file_problems = check_photo_files(photo_details, stack_details, edits_folders, edits_extensions)
+    for file_problem in file_problems:
+        print(file_problem)
+    print('{} file problem(s) found for {} photos'.format(len(file_problems), len(photo_details)))
+
+    return len(file_problems) == 0
+
+
 def rehash():
     start_photos_apple_script.run()
     cared_ids = set(try_again_timezone.keys())
@@ -318,24 +479,55 @@ def rehash_single_photo(photo_id):
     assign_photo_closest_city_and_date_time(closest_city, date_time)
 
 
-def get_stack_details(photo_details: dict) -> dict:
+def get_stack_details(photo_details: dict, stack_companions: Optional[dict] = None) -> dict:
+    # stack id -> {photo id -> photo info} for every photo in the stack, even ones a filter left out of photo_details
     stack_details = {}
 
-    for photo_id in photo_details:
-        photo_stack = photo_details[photo_id]['stack']
-        if photo_stack is None:
-            continue
-
-        images_in_stack = stack_details.get(photo_stack)
-        if images_in_stack is None:
-            stack_details[photo_stack] = [photo_id]
-        else:
-            stack_details[photo_stack].append(photo_id)
+    for photo_details_part in [photo_details, stack_companions or {}]:
+        for photo_id, photo_info in photo_details_part.items():
+            photo_stack = photo_info['stack']
+            if photo_stack is None:
+                continue
+
+            images_in_stack = stack_details.get(photo_stack)
+            if images_in_stack is None:
+                stack_details[photo_stack] = {photo_id: photo_info}
+            else:
+                stack_details[photo_stack][photo_id] = photo_info
+
+    # keep the catalog order whether or not a filter split the stack, find_sister_photo_associated_with_aperture_edits relies on it
+    return {stack: dict(sorted(images_in_stack.items())) for stack, images_in_stack in stack_details.items()}
+
+
+def get_stack_companion_details(db_connection, photo_details: dict) -> dict:
+    stack_ids = sorted({photo_info['stack'] for photo_info in photo_details.values() if photo_info['stack'] is not None})
+    stack_companions = {}
+
+    # stay under SQLite's limit on the number of parameters
+    for start in range(0, len(stack_ids), 500):
+        chunk = stack_ids[start:start + 500]
+        companions_query = """SELECT Adobe_images.id_local, AgLibraryFolderStackImage.stack,
+                                     AgLibraryRootFolder.absolutePath || AgLibraryFolder.pathFromRoot || AgLibraryFile.baseName || '.' || AgLibraryFile.extension as file
+                              FROM AgLibraryFolderStackImage
+                              JOIN Adobe_images ON Adobe_images.id_local = AgLibraryFolderStackImage.image
+                              JOIN AgLibraryFile ON AgLibraryFile.id_local = Adobe_images.rootFile
+                              JOIN AgLibraryFolder ON AgLibraryFolder.id_local = AgLibraryFile.folder
+                              JOIN AgLibraryRootFolder ON AgLibraryRootFolder.id_local = AgLibraryFolder.rootFolder
+                              WHERE AgLibraryFolderStackImage.stack IN ({})""".format(', '.join('?' * len(chunk)))
+
+        for (image_id, stack, file) in db_connection.execute(companions_query, chunk):
+            if image_id in photo_details:
+                continue
+            stack_companions[image_id] = {
+                'stack': stack,
+                'file': file,
+                'albums': get_associated_album_ids_for_picture(image_id, db_connection)
+            }
 
-    return stack_details
+    return stack_companions
 
 
-def read_entities_with_parent(parent: Optional[int], db_connection):
+def read_entities_with_parent(parent: Optional[int], db_connection, album_ids: Optional[set] = None):
     entity_tree = {}
 
     parent_check = 'ISNULL' if parent is None else '= {}'.format(parent)
@@ -351,15 +543,20 @@ def read_entities_with_parent(parent: Optional[int], db_connection):
     for (entity_id, entity_name, entity_type) in db_connection.execute(entities_query):
         # print('name={}, type={}'.format(entity_name, entity_type))
         if entity_type == 'com.adobe.ag.library.collection':
+            if album_ids is not None and entity_id not in album_ids:
+                continue  # none of the selected photos are in this album
             entity_tree[entity_id] = {
                 'type': entity_type,
                 'name': entity_name
              }
         elif entity_type == 'com.adobe.ag.library.group':
+            children = read_entities_with_parent(entity_id, db_connection, album_ids)
+            if album_ids is not None and len(children) == 0:
+                continue
             entity_tree[entity_id] = {
                 'type': entity_type,
                 'name': entity_name,
-                'children': read_entities_with_parent(entity_id, db_connection)
+                'children': children
             }
 
     return entity_tree
@@ -384,7 +581,7 @@ def walk_entity_tree(node, parent) -> dict:
 
 
 def create_folder_in_photos(name: str, parent_entity_name: Optional[str]):
-    print('Creating folder {} in {}'.format(name, parent_entity_name))
+    print('Creating or reusing folder {} in {}'.format(name, parent_entity_name))
     if parent_entity_name is None:
         create_folder_apple_script_root.run(name)
     else:
@@ -392,23 +589,30 @@ def create_folder_in_photos(name: str, parent_entity_name: Optional[str]):
 
 
 def create_album_in_photos(name: str, parent_entity_name: Optional[str]) -> str:
-    print('Creating album {} in {}'.format(name, parent_entity_name))
+    print('Creating or reusing album {} in {}'.format(name, parent_entity_name))
     if parent_entity_name is None:
         result = create_album_apple_script_root.run(name)
-        return result[applescript.AEType(b'seld')]
+        return photos_id_from_result(result)
     else:
         result = create_album_apple_script.run(name, parent_entity_name)
-        return result[applescript.AEType(b'seld')]
+        return photos_id_from_result(result)
 
 
-def get_all_photo_details(db_connection):
+def get_all_photo_details(db_connection, photo_filter: Optional[dict] = None, keyword_index: Optional[dict] = None):
     photo_details = {}
 
+    if keyword_index is None:
+        keyword_index = read_keyword_index(db_connection, photo_filter)
+    no_keywords = array('I')
+
+    filter_clause, filter_parameters = compile_photo_filter(photo_filter or {})
+
     all_details_query = """SELECT Adobe_images.id_local as photo_id, Adobe_images.orientation as orientation, Adobe_images.rating as rating,
                                   AgHarvestedExifMetadata.gpsLatitude as latitude, AgHarvestedExifMetadata.gpsLongitude as longitude,
                                   AgLibraryRootFolder.absolutePath || AgLibraryFolder.pathFromRoot || AgLibraryFile.baseName || '.' || AgLibraryFile.extension as file,
                                   Adobe_AdditionalMetadata.xmp, Adobe_images.captureTime, Adobe_imageDevelopSettings.hasDevelopAdjustmentsEx as edits,
-                                  AgLibraryFolderStackImage.stack as stack, Adobe_images.colorLabels as colorLabels
+                                  AgLibraryFolderStackImage.stack as stack, Adobe_images.colorLabels as colorLabels,
+                                  AgLibraryRootFolder.name || '/' || AgLibraryFolder.pathFromRoot as folder
                            FROM Adobe_images
                            JOIN AgLibraryFile ON AgLibraryFile.id_local = Adobe_images.rootFile
                            JOIN AgHarvestedExifMetadata ON AgHarvestedExifMetadata.image = Adobe_images.id_local
@@ -416,9 +620,10 @@ def get_all_photo_details(db_connection):
                            JOIN AgLibraryRootFolder ON AgLibraryRootFolder.id_local = AgLibraryFolder.rootFolder
                            JOIN Adobe_AdditionalMetadata ON Adobe_AdditionalMetadata.image = Adobe_images.id_local
                            JOIN Adobe_imageDevelopSettings ON Adobe_imageDevelopSettings.image = Adobe_images.id_local
-                           LEFT JOIN AgLibraryFolderStackImage ON AgLibraryFolderStackImage.image = Adobe_images.id_local"""
+                           LEFT JOIN AgLibraryFolderStackImage ON AgLibraryFolderStackImage.image = Adobe_images.id_local
+                           WHERE {}""".format(filter_clause)
 
-    for (image_id, orientation, rating, latitude, longitude, file, xmp, date_time, edits, stack, colorLabels) in db_connection.execute(all_details_query):
+    for (image_id, orientation, rating, latitude, longitude, file, xmp, date_time, edits, stack, colorLabels, folder) in db_connection.execute(all_details_query, filter_parameters):
         photo_details[image_id] = {
             'name': extract_name_from_xmp(xmp),
             'modified_date_time': date_time,
@@ -427,19 +632,82 @@ def get_all_photo_details(db_connection):
             'latitude': latitude,
             'longitude': longitude,
             'albums': get_associated_album_ids_for_picture(image_id, db_connection),
-            'keywords': get_associated_keywords_for_picture(image_id, db_connection),
+            'keyword_ids': keyword_index['photo_keywords'].get(image_id, no_keywords),
+            'keyword_timezone': keyword_index['photo_timezones'].get(image_id, None),
+            'multiple_timezone_keywords': image_id in keyword_index['multiple_timezone_photos'],
             'edits': True if edits == 1 else False,
             'stack': stack,
             'colorLabels': colorLabels,
+            'folder': folder,
             'file': file
         }
-        # TODO: remove early break
-        # if len(photo_details) > 5:
-        #     break
 
     return photo_details
 
 
+def compile_photo_filter(photo_filter: dict) -> Tuple[str, list]:
+    conditions = []
+    parameters = []
+
+    if photo_filter.get('root_folder') is not None:
+        conditions.append('AgLibraryRootFolder.name = ?')
+        parameters.append(photo_filter['root_folder'])
+
+    if photo_filter.get('path_prefix') is not None:
+        conditions.append('substr(AgLibraryRootFolder.absolutePath || AgLibraryFolder.pathFromRoot, 1, ?) = ?')
+        parameters += [len(photo_filter['path_prefix']), photo_filter['path_prefix']]
+
+    # captureTime is an ISO 8601 string, so comparing the strings compares the times
+    if photo_filter.get('captured_after') is not None:
+        conditions.append('Adobe_images.captureTime >= ?')
+        parameters.append(photo_filter['captured_after'])
+
+    if photo_filter.get('captured_before') is not None:
+        conditions.append('Adobe_images.captureTime < ?')
+        parameters.append(photo_filter['captured_before'])
+
+    if photo_filter.get('minimum_rating') is not None:
+        conditions.append('COALESCE(Adobe_images.rating, 0) >= ?')  # unrated photos have no rating, count them as 0
+        parameters.append(photo_filter['minimum_rating'])
+
+    if photo_filter.get('color_label') is not None:
+        conditions.append('Adobe_images.colorLabels = ?')
+        parameters.append(photo_filter['color_label'])
+
+    if photo_filter.get('collection') is not None:
+        # the named collection or collection set and everything below it
+        conditions.append("""Adobe_images.id_local IN (
+                                 WITH RECURSIVE selected_collections(id_local) AS (
+                                     SELECT id_local FROM AgLibraryCollection WHERE name = ?
+                                     UNION
+                                     SELECT AgLibraryCollection.id_local
+                                     FROM AgLibraryCollection
+                                     JOIN selected_collections ON AgLibraryCollection.parent = selected_collections.id_local
+                                 )
+                                 SELECT AgLibraryCollectionImage.image
+                                 FROM AgLibraryCollectionImage
+                                 JOIN selected_collections ON selected_collections.id_local = AgLibraryCollectionImage.collection)""")
+        parameters.append(photo_filter['collection'])
+
+    if len(conditions) == 0:
+        return '1', parameters
+
+    return ' AND '.join(conditions), parameters
+
+
+def get_selected_album_ids(photo_details: dict, stack_details: dict) -> set:
+    album_ids = set()
+    for photo_id, photo_info in photo_details.items():
+        album_ids.update(photo_info['albums'])
+        if 'Aperture_preview' in photo_info['file']:
+            # modify_details_for_edits gives Aperture previews the albums of their sister photo
+            sister_photo_id = find_sister_photo_associated_with_aperture_edits(photo_id, photo_info['stack'], stack_details)
+            if sister_photo_id is not None:
+                album_ids.update(stack_details[photo_info['stack']][sister_photo_id]['albums'])
+
+    return album_ids
+
+
 def extract_name_from_xmp(xmp: str) -> str:
     xml_tree = ElementTree.fromstring(xmp)
     xml_namespaces = {'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
@@ -457,23 +725,120 @@ def get_associated_album_ids_for_picture(picture_id: int, db_connection) -> List
     return [album_id for (album_id,) in db_connection.execute(picture_collections_query, (picture_id,))]
 
 
-def get_associated_keywords_for_picture(picture_id: int, db_connection) -> List[int]:
-    picture_collections_query = """SELECT AgLibraryKeyword.name
-                                   FROM AgLibraryKeywordImage
-                                   JOIN AgLibraryKeyword ON AgLibraryKeyword.id_local == AgLibraryKeywordImage.tag
-                                   WHERE AgLibraryKeywordImage.image = ?"""
+def read_keyword_index(db_connection, photo_filter: Optional[dict] = None, flatten_keywords: bool = False) -> dict:
+    # keywords are referred to by their position in these lists instead of by id_local, so a photo's keywords fit in a
+    # small array and every photo shares the same interned name strings
+    keyword_index = {
+        'names': [],
+        'export_names': [],
+        'positions': {},
+        'excluded': set(),
+        'timezone_keywords': {},
+        'photo_keywords': {},
+        'keyword_photos': {},
+        'photo_timezones': {},
+        'multiple_timezone_photos': set()
+    }
+
+    read_keyword_hierarchy(db_connection, keyword_index, flatten_keywords)
+    read_keyword_images(db_connection, keyword_index, photo_filter)
+    resolve_keyword_timezones(keyword_index)
+
+    return keyword_index
+
+
+def read_keyword_hierarchy(db_connection, keyword_index: dict, flatten_keywords: bool):
+    # a genealogy is the chain of ids from the root, so sorting by it puts every parent ahead of its children
+    keywords_query = """SELECT id_local, name, parent
+                        FROM AgLibraryKeyword
+                        ORDER BY genealogy"""
+
+    for (keyword_id, name, parent) in db_connection.execute(keywords_query):
+        position = len(keyword_index['names'])
+        parent_position = keyword_index['positions'].get(parent, -1)
+        keyword_index['positions'][keyword_id] = position
+
+        name = sys.intern(name) if name is not None else None  # the root of the hierarchy has no name
+        export_name = name
+        if flatten_keywords and name is not None and parent_position != -1 and keyword_index['names'][parent_position] is not None:
+            export_name = sys.intern(keyword_index['export_names'][parent_position] + keyword_separator + name)
+
+        keyword_index['names'].append(name)
+        keyword_index['export_names'].append(export_name)
+
+        if name is None or any(exclusion in name for exclusion in keyword_exclusions):
+            keyword_index['excluded'].add(position)
+        elif name[:3] == 'tz-':
+            keyword_index['timezone_keywords'][position] = name[3:]
+
+
+def read_keyword_images(db_connection, keyword_index: dict, photo_filter: Optional[dict]):
+    keyword_images_query = """SELECT AgLibraryKeywordImage.image, AgLibraryKeywordImage.tag
+                              FROM AgLibraryKeywordImage"""
+    parameters = []
+    if photo_filter:
+        filter_clause, parameters = compile_photo_filter(photo_filter)
+        keyword_images_query += """
+                              WHERE AgLibraryKeywordImage.image IN (
+                                  SELECT Adobe_images.id_local
+                                  FROM Adobe_images
+                                  JOIN AgLibraryFile ON AgLibraryFile.id_local = Adobe_images.rootFile
+                                  JOIN AgLibraryFolder ON AgLibraryFolder.id_local = AgLibraryFile.folder
+                                  JOIN AgLibraryRootFolder ON AgLibraryRootFolder.id_local = AgLibraryFolder.rootFolder
+                                  WHERE {})""".format(filter_clause)
+
+    positions = keyword_index['positions']
+    excluded = keyword_index['excluded']
+    photo_keywords = keyword_index['photo_keywords']
+    keyword_photos = keyword_index['keyword_photos']
+
+    for (image_id, keyword_id) in db_connection.execute(keyword_images_query, parameters):
+        position = positions.get(keyword_id)
+        if position is None or position in excluded:
+            continue
+
+        keywords = photo_keywords.get(image_id)
+        if keywords is None:
+            keywords = photo_keywords[image_id] = array('I')
+        keywords.append(position)
+
+        photos = keyword_photos.get(position)
+        if photos is None:
+            photos = keyword_photos[position] = array('q')
+        photos.append(image_id)
+
+
+def resolve_keyword_timezones(keyword_index: dict):
+    photo_timezone_keywords = {}
+    for position in keyword_index['timezone_keywords']:
+        for image_id in keyword_index['keyword_photos'].get(position, []):
+            photo_timezone_keywords.setdefault(image_id, []).append(position)
+
+    for image_id, positions in photo_timezone_keywords.items():
+        if len(positions) > 1:
+            keyword_index['multiple_timezone_photos'].add(image_id)  # only a problem for suspect timezones, which are reported later
+            continue
+        keyword_index['photo_timezones'][image_id] = keyword_index['timezone_keywords'][positions[0]]
+
+
+def keyword_names_for_photo(photo_info: dict, keyword_index: dict) -> List[str]:
+    export_names = keyword_index['export_names']
+    return [export_names[position] for position in photo_info['keyword_ids']]
 
-    return [keyword for (keyword,) in db_connection.execute(picture_collections_query, (picture_id,)) if 'Aperture Stack ' not in keyword]
 
+def timezone_keyword_name(timezone: str, photo_info: dict, keyword_index: dict) -> Optional[str]:
+    for position in photo_info['keyword_ids']:
+        if keyword_index['timezone_keywords'].get(position) == timezone:
+            return keyword_index['export_names'][position]
 
-def import_photos(photo_details: dict, album_conversion: dict, stack_details: dict):
+    return None
+
+
+def import_photos(photo_details: dict, album_conversion: dict, stack_details: dict, keyword_index: dict):
     time.sleep(5)
     for photo_id, photo_info in photo_details.items():
-        if photo_paired_with_aperture_software_edits(photo_id, photo_info['stack'], stack_details, photo_details):
-            print('Skipping import of {} because Aperture edits'.format(photo_id))
-            continue  # skip this photo since we wanted the Aperture edited version
-        modify_details_for_lightroom_edits(photo_id, photo_details)
-        modify_details_for_edits(photo_id, photo_details, stack_details)
+        if not prepare_photo_for_import(photo_id, photo_details, stack_details, keyword_index):
+            continue
         generate_photo_metadata(photo_info)
         rotate_image(photo_info)
         set_timezone(photo_info.get('timezone', None))
@@ -484,18 +849,25 @@ def import_photos(photo_details: dict, album_conversion: dict, stack_details: di
         add_photo_to_albums(photos_photo_id, photo_info['albums'], album_conversion)
 
 
-def rotate_image(photo_info: dict):
-    orientation_converter = {
-        'AB': 1,
-        'BC': 6,
-        'CD': 3,
-        'DA': 8
-    }
+def prepare_photo_for_import(photo_id: int, photo_details: dict, stack_details: dict, keyword_index: dict) -> bool:
+    photo_info = photo_details[photo_id]
+    if photo_paired_with_aperture_software_edits(photo_id, photo_info['stack'], stack_details):
+        print('Skipping import of {} because Aperture edits'.format(photo_id))
+        return False  # skip this photo since we wanted the Aperture edited version
+    photo_info['keywords'] = keyword_names_for_photo(photo_info, keyword_index)
+    if photo_info['keyword_timezone'] is not None:
+        photo_info['keyword_timezone_name'] = timezone_keyword_name(photo_info['keyword_timezone'], photo_info, keyword_index)
+    modify_details_for_lightroom_edits(photo_id, photo_details)
+    modify_details_for_edits(photo_id, photo_details, stack_details)
+
+    return True
 
+
+def rotate_image(photo_info: dict):
     if photo_info['orientation'] is None or photo_info['exif_orientation'] is None:
         return
 
-    lightroom_orientation = orientation_converter[photo_info['orientation']]
+    lightroom_orientation = lightroom_to_exif_orientation[photo_info['orientation']]
     exif_orientation = photo_info['exif_orientation']
 
     if lightroom_orientation != exif_orientation:
@@ -504,15 +876,15 @@ def rotate_image(photo_info: dict):
         subprocess.run(['/usr/local/bin/exiftool', '-overwrite_original', '-orientation#={}'.format(lightroom_orientation), photo_info['file']])
 
 
-def photo_paired_with_aperture_software_edits(photo_id: int, stack_id: int, stack_details: dict, photo_details: dict) -> bool:
+def photo_paired_with_aperture_software_edits(photo_id: int, stack_id: int, stack_details: dict) -> bool:
     if stack_id is None:
         return False
 
-    photos_in_stack: list = stack_details[stack_id]
+    photos_in_stack: dict = stack_details[stack_id]
     for other_photo_id in photos_in_stack:
         if other_photo_id == photo_id:
             continue  # don't check yourself
-        if 'Aperture_preview' in photo_details[other_photo_id]['file']:
+        if 'Aperture_preview' in photos_in_stack[other_photo_id]['file']:
             return True
 
     return False
@@ -533,10 +905,131 @@ def find_sister_photo_associated_with_aperture_edits(photo_id: int, stack_id: in
 
 def modify_details_for_lightroom_edits(photo_id: int, photo_details: dict):
     photo_info = photo_details[photo_id]
-    if photo_info['edits'] is True:
+    if photo_info['edits'] is True and photo_info.get('edited_file', None) is not None:
+        photo_info['file'] = photo_info['edited_file']
+
+
+def check_photo_files(photo_details: dict, stack_details: dict, edits_folders: List[str], edits_extensions: List[str]) -> List[str]:
+    # photos skipped for their Aperture edits are never imported, so their files don't matter
+    photo_details = get_importable_photo_details(photo_details, stack_details)
+    edits_index = build_edits_index(edits_folders, edits_extensions)
+    file_problems = resolve_edited_files(photo_details, edits_index)
+    file_problems += find_missing_files(photo_details)
+
+    return file_problems
+
+
+def get_importable_photo_details(photo_details: dict, stack_details: dict) -> dict:
+    return {photo_id: photo_info for photo_id, photo_info in photo_details.items()
+            if not photo_paired_with_aperture_software_edits(photo_id, photo_info['stack'], stack_details)}
+
+
+def build_edits_index(edits_folders: List[str], edits_extensions: List[str]) -> dict:
+    extensions = {extension.lower().lstrip('.') for extension in edits_extensions}
+    edits_index = {}
+
+    folders_to_scan = list(edits_folders)
+    while len(folders_to_scan) > 0:
+        folder = folders_to_scan.pop()
+        try:
+            folder_entries = os.scandir(folder)
+        except OSError:
+            print('Unable to scan edits folder {}'.format(folder))
+            continue
+
+        with folder_entries:
+            for entry in folder_entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders_to_scan.append(entry.path)
+                    continue
+
+                base_name, extension = path.splitext(entry.name)
+                if extension[1:].lower() in extensions:
+                    edits_index.setdefault(base_name, []).append(entry.path)
+
+    for base_name in edits_index:
+        edits_index[base_name].sort()
+
+    return edits_index
+
+
+def resolve_edited_files(photo_details: dict, edits_index: dict) -> List[str]:
+    file_problems = []
+    edit_claims = {}
+
+    for photo_id, photo_info in photo_details.items():
+        if photo_info['edits'] is not True:
+            continue
+
+        photo_info['edited_file'] = None
         base_name = path.splitext(path.basename(photo_info['file']))[0]
-        new_path = path.join(lighroom_edits_folder, f'{base_name}.tif')
-        photo_info['file'] = new_path
+        edited_files = choose_closest_files(photo_info['file'], edits_index.get(base_name, []))
+        if len(edited_files) == 0:
+            file_problems.append('Missing edits for {}: {}'.format(photo_id, photo_info['file']))
+        elif len(edited_files) > 1:
+            file_problems.append('Ambiguous edits for {}: {}'.format(photo_id, ', '.join(edited_files)))
+        else:
+            edit_claims.setdefault(edited_files[0], {}).setdefault(photo_info['file'], []).append(photo_id)
+
+    # camera counters wrap, so originals in different folders can land on the same edit, which only goes to the closest one.
+    # Virtual copies share their original, so they share its edit too
+    for edited_file, claiming_photos in edit_claims.items():
+        closest_originals = choose_closest_files(edited_file, list(claiming_photos))
+        for original_file, photo_ids in claiming_photos.items():
+            for photo_id in photo_ids:
+                if len(closest_originals) > 1 and original_file in closest_originals:
+                    file_problems.append('Ambiguous edits for {}: {} is also the edit of {}'.format(
+                        photo_id, edited_file, ', '.join(other_file for other_file in closest_originals if other_file != original_file)))
+                elif original_file in closest_originals:
+                    photo_details[photo_id]['edited_file'] = edited_file
+                else:
+                    file_problems.append('Missing edits for {}: {} ({} is the edit of {})'.format(
+                        photo_id, original_file, edited_file, closest_originals[0]))
+
+    return file_problems
+
+
+def choose_closest_files(file_path: str, candidate_files: List[str]) -> List[str]:
+    if len(candidate_files) <= 1:
+        return candidate_files
+
+    # basename collision across folders, prefer the candidates whose folders best match the file's folders
+    folders = path.dirname(file_path).split(os.sep)
+    best_score = -1
+    best_candidate_files = []
+    for candidate_file in candidate_files:
+        score = count_matching_trailing_folders(path.dirname(candidate_file).split(os.sep), folders)
+        if score > best_score:
+            best_score = score
+            best_candidate_files = [candidate_file]
+        elif score == best_score:
+            best_candidate_files.append(candidate_file)
+
+    return best_candidate_files
+
+
+def count_matching_trailing_folders(folders: List[str], other_folders: List[str]) -> int:
+    matching = 0
+    for folder, other_folder in zip(reversed(folders), reversed(other_folders)):
+        if folder != other_folder:
+            break
+        matching += 1
+
+    return matching
+
+
+def find_missing_files(photo_details: dict) -> List[str]:
+    files_to_check = set()
+    for photo_info in photo_details.values():
+        files_to_check.add(photo_info['file'])
+        if photo_info.get('edited_file', None) is not None:
+            files_to_check.add(photo_info['edited_file'])
+
+    files_to_check = sorted(files_to_check)
+    with ThreadPoolExecutor(max_workers=file_check_workers) as executor:
+        files_exist = list(executor.map(path.isfile, files_to_check))
+
+    return ['Missing file {}'.format(file) for file, file_exists in zip(files_to_check, files_exist) if not file_exists]
 
 
 def modify_details_for_edits(photo_id: int, photo_details: dict, stack_details: dict):
@@ -551,7 +1044,7 @@ def modify_details_for_edits(photo_id: int, photo_details: dict, stack_details:
 
         sister_photo_id = find_sister_photo_associated_with_aperture_edits(photo_id, stack_id, stack_details)
         if sister_photo_id is not None:
-            photo_info['albums'] += photo_details[sister_photo_id]['albums']
+            photo_info['albums'] += stack_details[stack_id][sister_photo_id]['albums']
 
 
 def set_timezone(timezone: str):
@@ -567,7 +1060,7 @@ def set_timezone(timezone: str):
 def import_photo(file_path) -> str:
     print('Importing {}'.format(file_path))
     result = import_photo_apple_script.run(file_path)
-    return result[0][applescript.AEType(b'seld')]
+    return photos_id_from_result(result[0])
 
 
 def generate_photo_metadata(photo_info: dict):
@@ -598,7 +1091,7 @@ def press_keydown_until_find_photos(photo_ids: set):
         time.sleep(1.0)
         applescript_result = get_photos_selection_apple_script.run()
         if len(applescript_result) > 0:
-            selected_id = applescript_result[0][applescript.AEType(b'seld')]
+            selected_id = photos_id_from_result(applescript_result[0])
             print(selected_id)
 
     return selected_id
@@ -627,7 +1120,7 @@ def set_photo_timezone_through_photos(photos_photo_id: str, photo_info: dict):
         time.sleep(1.0)
         applescript_result = get_photos_selection_apple_script.run()
         if len(applescript_result) > 0:
-            selected_id = applescript_result[0][applescript.AEType(b'seld')]
+            selected_id = photos_id_from_result(applescript_result[0])
             print(selected_id)
 
     date_time: datetime.datetime = photo_info['datetime_photos']
@@ -672,7 +1165,6 @@ def determine_datetime(photo_info: dict) -> Tuple[Optional[str], Optional[str]]:
     file_path = photo_info['file']
     latitude = photo_info['latitude']
     longitude = photo_info['longitude']
-    keywords = photo_info['keywords']
 
     with open(file_path, 'rb') as image_file:
         exif_tags = exifread.process_file(image_file, details=False)
@@ -696,13 +1188,13 @@ def determine_datetime(photo_info: dict) -> Tuple[Optional[str], Optional[str]]:
     if 'GPS GPSTimeStamp' not in exif_tags or 'GPS GPSDate' not in exif_tags or file_path[-3:] == 'CR2' or file_path[-3:] == 'cr2':
         tag_to_add = 'timezone suspect'
         print('Timezone is suspect')
-        timezone_keyword = extract_timezone_from_keywords(keywords)
+        timezone_keyword = extract_timezone_from_keywords(photo_info)
         if timezone_keyword is not None:
             print('...but tz in keywords {}'.format(timezone_keyword))
             photo_info['timezone'] = timezone_keyword
             tag_to_add = None
         elif latitude is not None and longitude is not None:
-            timezone = tf.timezone_at(lat=latitude, lng=longitude)
+            timezone = lookup_timezone(latitude, longitude)
             print('...but looking up lat/long tz is {}'.format(timezone))
             photo_info['timezone'] = timezone
             tag_to_add = None
@@ -733,16 +1225,20 @@ def determine_datetime(photo_info: dict) -> Tuple[Optional[str], Optional[str]]:
     return (datetime_to_set, tag_to_add)
 
 
-def extract_timezone_from_keywords(keywords: list) -> Optional[str]:
-    timezone_keywords = [keyword for keyword in keywords if keyword[:3] == 'tz-']
-    if len(timezone_keywords) > 1:
+def extract_timezone_from_keywords(photo_info: dict) -> Optional[str]:
+    # which photos have a single tz- keyword was worked out for the whole catalog in resolve_keyword_timezones
+    if photo_info.get('multiple_timezone_keywords', False):
         print('Multiple timezone keywords!')
         return None
-    elif len(timezone_keywords) == 0:
+
+    timezone = photo_info.get('keyword_timezone', None)
+    if timezone is None:
         return None
-    else:
-        keywords.remove(timezone_keywords[0])
-        return timezone_keywords[0][3:]
+
+    timezone_keyword = photo_info.get('keyword_timezone_name', None)
+    if timezone_keyword in photo_info['keywords']:
+        photo_info['keywords'].remove(timezone_keyword)
+    return timezone
 
 
 def datetime_from_db(datetime_str: str) -> Optional[datetime.datetime]:
@@ -791,8 +1287,90 @@ def add_photo_to_albums(photos_photo_id: str, lightroom_album_ids: List[int], al
             pass  # a photo was slated to go into an album that I decided not to move over, like a slideshow "album"
 
 
+def parse_arguments(arguments: List[str]):
+    from LightroomExport import filesystem_export  # it builds on this module, so it can only be imported once this is loaded
+
+    parser = argparse.ArgumentParser(description='Export a Lightroom catalog to Apple Photos')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='import the catalog into Photos (macOS only)')
+    plan_parser = subparsers.add_parser('plan', help='print the albums and imports a migrate would do')
+    stats_parser = subparsers.add_parser('stats', help='print counts about the catalog')
+    verify_parser = subparsers.add_parser('verify', help='report every original or edit that is missing')
+    export_parser = subparsers.add_parser('export', help='link the catalog into a folder tree with XMP sidecars')
+    subparsers.add_parser('rehash', help='redo the timezone of the photos in try_again_timezone (macOS only)')
+
+    for command_parser in [migrate_parser, plan_parser, stats_parser, verify_parser, export_parser]:
+        add_catalog_arguments(command_parser)
+
+    for command_parser in [migrate_parser, plan_parser, stats_parser, export_parser]:
+        add_keyword_arguments(command_parser)
+
+    for command_parser in [migrate_parser, plan_parser, verify_parser, export_parser]:
+        add_edits_arguments(command_parser)
+
+    filesystem_export.add_export_arguments(export_parser)
+
+    return parser.parse_args(arguments)
+
+
+def add_catalog_arguments(parser):
+    parser.add_argument('database_path')
+    parser.add_argument('--root-folder', help='only photos in the root folder with this name')
+    parser.add_argument('--path-prefix', help='only photos whose path starts with this')
+    parser.add_argument('--captured-after', help='only photos captured at or after this, like 2019-01-01')
+    parser.add_argument('--captured-before', help='only photos captured before this, like 2020-01-01')
+    parser.add_argument('--minimum-rating', type=int, help='only photos rated at least this')
+    parser.add_argument('--color-label', help='only photos with this color label, like Red')
+    parser.add_argument('--collection', help='only photos in this collection or anything in this collection set')
+
+
+def add_keyword_arguments(parser):
+    parser.add_argument('--flatten-keywords', action='store_true', help='name keywords with their parents, like Places|Europe|Paris')
+
+
+def add_edits_arguments(parser):
+    parser.add_argument('--edits-folder', dest='edits_folders', action='append',
+                        help='folder of Lightroom edits, can be given more than once')
+    parser.add_argument('--edits-extension', dest='edits_extensions', action='append',
+                        help='extension of Lightroom edits, can be given more than once')
+
+
+def photo_filter_from_arguments(arguments) -> dict:
+    filter_keys = ['root_folder', 'path_prefix', 'captured_after', 'captured_before', 'minimum_rating', 'color_label', 'collection']
+    return {key: getattr(arguments, key) for key in filter_keys if getattr(arguments, key) is not None}
+
+
+def cli(arguments: List[str]):
+    arguments = parse_arguments(arguments)
+
+    if arguments.command == 'rehash':
+        rehash()
+        return
+
+    photo_filter = photo_filter_from_arguments(arguments)
+
+    if arguments.command == 'stats':
+        stats(arguments.database_path, photo_filter, arguments.flatten_keywords)
+        return
+
+    edits_folders = arguments.edits_folders or lighroom_edits_folders
+    edits_extensions = arguments.edits_extensions or lighroom_edits_extensions
+
+    if arguments.command == 'migrate':
+        print('Transitioning {}'.format(arguments.database_path))
+        main(arguments.database_path, edits_folders, edits_extensions, photo_filter, arguments.flatten_keywords)
+    elif arguments.command == 'plan':
+        plan(arguments.database_path, edits_folders, edits_extensions, photo_filter, arguments.flatten_keywords)
+    elif arguments.command == 'verify':
+        if not verify(arguments.database_path, edits_folders, edits_extensions, photo_filter):
+            sys.exit(1)
+    elif arguments.command == 'export':
+        from LightroomExport import filesystem_export
+        if not filesystem_export.export_catalog(arguments.database_path, arguments.destination, edits_folders, edits_extensions,
+                                                arguments.link_mode, photo_filter, arguments.flatten_keywords, arguments.workers):
+            sys.exit(1)
+
+
 if __name__ == '__main__':
-    database_path = sys.argv[1]
-    print('Transitioning {}'.format(database_path))
-    main(database_path)
-    # rehash()
+    cli(sys.argv[1:])
@@ -0,0 +1,487 @@
+# Generates a fake Lightroom catalog that has the tables and columns main.py reads, so the catalog reading and
+# planning code can be run and timed without a real (private) catalog.
+
+import sqlite3
+from typing import Optional, List, Tuple
+from os import path
+import os
+import sys
+import random
+import struct
+import argparse
+
+from LightroomExport import main
+
+
+catalog_schema = """
+CREATE TABLE AgLibraryRootFolder (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, absolutePath UNIQUE NOT NULL DEFAULT '',
+                                  name NOT NULL DEFAULT '', relativePathFromCatalog);
+CREATE TABLE AgLibraryFolder (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, pathFromRoot NOT NULL DEFAULT '',
+                              rootFolder INTEGER NOT NULL DEFAULT 0, visibility INTEGER);
+CREATE TABLE AgLibraryFile (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, baseName NOT NULL DEFAULT '',
+                            extension NOT NULL DEFAULT '', folder INTEGER NOT NULL DEFAULT 0, idx_filename NOT NULL DEFAULT '',
+                            lc_idx_filename NOT NULL DEFAULT '', originalFilename NOT NULL DEFAULT '');
+CREATE TABLE Adobe_images (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, captureTime, colorLabels NOT NULL DEFAULT '',
+                           fileFormat NOT NULL DEFAULT 'unset', orientation, pick NOT NULL DEFAULT 0, rating,
+                           rootFile INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE AgHarvestedExifMetadata (id_local INTEGER PRIMARY KEY, image INTEGER, gpsLatitude, gpsLongitude, hasGPS INTEGER);
+CREATE TABLE Adobe_AdditionalMetadata (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, image INTEGER, xmp NOT NULL DEFAULT '');
+CREATE TABLE Adobe_imageDevelopSettings (id_local INTEGER PRIMARY KEY, image INTEGER, hasDevelopAdjustmentsEx, text);
+CREATE TABLE AgLibraryFolderStackImage (id_local INTEGER PRIMARY KEY, collapsed INTEGER NOT NULL DEFAULT 0, image INTEGER NOT NULL DEFAULT 0,
+                                        position NOT NULL DEFAULT '', stack INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE AgLibraryCollection (id_local INTEGER PRIMARY KEY, creationId NOT NULL DEFAULT '', genealogy NOT NULL DEFAULT '',
+                                  imageCount, name NOT NULL DEFAULT '', parent INTEGER, systemOnly NOT NULL DEFAULT '');
+CREATE TABLE AgLibraryCollectionImage (id_local INTEGER PRIMARY KEY, collection INTEGER NOT NULL DEFAULT 0, image INTEGER NOT NULL DEFAULT 0,
+                                       pick NOT NULL DEFAULT 0, positionInCollection);
+CREATE TABLE AgLibraryKeyword (id_local INTEGER PRIMARY KEY, id_global UNIQUE NOT NULL, dateCreated NOT NULL DEFAULT '',
+                               genealogy NOT NULL DEFAULT '', imageCountCache DEFAULT -1, includeOnExport INTEGER NOT NULL DEFAULT 1,
+                               includeParents INTEGER NOT NULL DEFAULT 1, includeSynonyms INTEGER NOT NULL DEFAULT 1, keywordType,
+                               lastApplied, lc_name, name, parent INTEGER);
+CREATE TABLE AgLibraryKeywordImage (id_local INTEGER PRIMARY KEY, image INTEGER NOT NULL DEFAULT 0, tag INTEGER NOT NULL DEFAULT 0);
+
+CREATE INDEX index_AgLibraryFolder_rootFolderAndPath ON AgLibraryFolder (rootFolder, pathFromRoot);
+CREATE INDEX index_AgLibraryFile_folder ON AgLibraryFile (folder);
+CREATE INDEX index_Adobe_images_rootFile ON Adobe_images (rootFile);
+CREATE INDEX index_Adobe_images_captureTime ON Adobe_images (captureTime);
+CREATE INDEX index_AgHarvestedExifMetadata_image ON AgHarvestedExifMetadata (image);
+CREATE UNIQUE INDEX index_Adobe_AdditionalMetadata_imageIndex ON Adobe_AdditionalMetadata (image);
+CREATE INDEX index_Adobe_imageDevelopSettings_image ON Adobe_imageDevelopSettings (image);
+CREATE UNIQUE INDEX index_AgLibraryFolderStackImage_image ON AgLibraryFolderStackImage (image);
+CREATE INDEX index_AgLibraryFolderStackImage_stack ON AgLibraryFolderStackImage (stack);
+CREATE INDEX index_AgLibraryCollection_parentAndName ON AgLibraryCollection (parent, name);
+CREATE INDEX index_AgLibraryCollection_genealogy ON AgLibraryCollection (genealogy);
+CREATE INDEX index_AgLibraryCollectionImage_imageCollection ON AgLibraryCollectionImage (image, collection);
+CREATE INDEX index_AgLibraryCollectionImage_collectionPosition ON AgLibraryCollectionImage (collection, positionInCollection);
+CREATE INDEX index_AgLibraryKeyword_parentAndLcName ON AgLibraryKeyword (parent, lc_name);
+CREATE INDEX index_AgLibraryKeyword_genealogy ON AgLibraryKeyword (genealogy);
+CREATE INDEX index_AgLibraryKeywordImage_image ON AgLibraryKeywordImage (image);
+CREATE INDEX index_AgLibraryKeywordImage_tag ON AgLibraryKeywordImage (tag);
+"""
+
+xmp_template = """<x:xmpmeta xmlns:x="adobe:ns:meta/">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/">{}</rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>"""
+
+xmp_title_template = '<dc:title><rdf:Alt><rdf:li xml:lang="x-default">{}</rdf:li></rdf:Alt></dc:title>'
+
+synthetic_timezones = ['America/New_York', 'America/Los_Angeles', 'America/Chicago', 'Europe/Paris', 'Asia/Bangkok']
+
+# latitude, longitude pairs for places in synthetic_timezones
+synthetic_locations = [(40.7128, -74.0060), (34.0522, -118.2437), (41.8781, -87.6298), (48.8566, 2.3522), (13.7563, 100.5018)]
+
+# a 1x1 grey baseline JPEG without its APP0 segment, everything after the SOI marker
+tiny_jpeg_body = bytes.fromhex(
+    'ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123251d283a333d3c3933383740485c4e404457453738506d51575f626768'
+    '673e4d71797064785c656763ffc0000b080001000101011100ffc4001f0000010501010101010100000000000000000102030405060708090a'
+    '0bffc400b5100002010303020403050504040000017d01020300041105122131410613516107227114328191a1082342b1c11552d1f0243362'
+    '7282090a161718191a25262728292a3435363738393a434445464748494a535455565758595a636465666768696a737475767778797a838485'
+    '868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7'
+    'e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f002bffd9')
+
+tiff_ascii = 2
+tiff_short = 3
+tiff_long = 4
+tiff_rational = 5
+
+
+def generate_catalog(catalog_path: str, photo_count: int = 1000, collection_depth: int = 2, collection_fan_out: int = 4,
+                     albums_per_photo: int = 2, keyword_depth: int = 2, keyword_fan_out: int = 5, keywords_per_photo: int = 3,
+                     stack_size: int = 3, stacked_fraction: float = 0.1, aperture_stack_fraction: float = 0.2,
+                     edited_fraction: float = 0.1, gps_fraction: float = 0.5, timezone_keyword_fraction: float = 0.05,
+                     root_folder_count: int = 2, image_folder: Optional[str] = None, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    id_counter = IdCounter()
+
+    photos_folder = '/synthetic/Pictures' if image_folder is None else path.join(path.abspath(image_folder), 'Pictures')
+    edits_folder = '/synthetic/Edits' if image_folder is None else path.join(path.abspath(image_folder), 'Edits')
+
+    if path.exists(catalog_path):
+        os.remove(catalog_path)
+
+    with sqlite3.connect(catalog_path) as db_connection:
+        db_connection.executescript(catalog_schema)
+
+        album_ids = insert_collections(db_connection, id_counter, collection_depth, collection_fan_out)
+        keyword_ids, timezone_keyword_ids, aperture_stack_keyword_id = insert_keywords(db_connection, id_counter, keyword_depth,
+                                                                                       keyword_fan_out)
+        root_folders = insert_root_folders(db_connection, id_counter, rng, photos_folder, root_folder_count)
+
+        photos = plan_photos(rng, photo_count, stack_size, stacked_fraction, aperture_stack_fraction, edited_fraction,
+                             gps_fraction, root_folders)
+        insert_photos(db_connection, id_counter, rng, photos, album_ids, albums_per_photo, keyword_ids, keywords_per_photo,
+                      timezone_keyword_ids, timezone_keyword_fraction, aperture_stack_keyword_id)
+
+    if image_folder is not None:
+        write_image_files(photos, edits_folder)
+
+    return {
+        'catalog': catalog_path,
+        'photos': len(photos),
+        'albums': len(album_ids),
+        'keywords': len(keyword_ids) + len(timezone_keyword_ids) + 1,
+        'photos_folder': photos_folder,
+        'edits_folder': edits_folder
+    }
+
+
+class IdCounter:
+    # Lightroom hands out id_local from one sequence shared by every table, do the same so ids never line up by accident
+
+    def __init__(self):
+        self.last_id = 0
+
+    def next(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+
+def genealogy_for(ancestor_ids: List[int]) -> str:
+    return ''.join('/{}{}'.format(len(str(ancestor_id)), ancestor_id) for ancestor_id in ancestor_ids)
+
+
+def global_id(rng: random.Random) -> str:
+    return '{:032X}'.format(rng.getrandbits(128))
+
+
+def insert_collections(db_connection, id_counter: IdCounter, collection_depth: int, collection_fan_out: int) -> List[int]:
+    collections = []
+    album_ids = []
+
+    def add_children(parent_ids: List[int], label: str, depth: int):
+        for index in range(1, collection_fan_out + 1):
+            child_label = '{}.{}'.format(label, index) if label else str(index)
+            child_id = id_counter.next()
+            child_ids = parent_ids + [child_id]
+            parent_id = parent_ids[-1] if len(parent_ids) > 0 else None
+            if depth < collection_depth:
+                collections.append((child_id, 'com.adobe.ag.library.group', genealogy_for(child_ids), 'Folder {}'.format(child_label),
+                                    parent_id))
+                add_children(child_ids, child_label, depth + 1)
+            else:
+                collections.append((child_id, 'com.adobe.ag.library.collection', genealogy_for(child_ids),
+                                    'Album {}'.format(child_label), parent_id))
+                album_ids.append(child_id)
+
+    add_children([], '', 1)
+
+    # collections that the export ignores
+    for name, creation_id in [('quick collection', 'com.adobe.ag.library.collection'),
+                              ('Five Stars', 'com.adobe.ag.library.smart_collection'),
+                              ('Slideshow', 'com.adobe.ag.slideshow.savedCreation')]:
+        collection_id = id_counter.next()
+        collections.append((collection_id, creation_id, genealogy_for([collection_id]), name, None))
+
+    db_connection.executemany("""INSERT INTO AgLibraryCollection (id_local, creationId, genealogy, name, parent)
+                                 VALUES (?, ?, ?, ?, ?)""", collections)
+
+    return album_ids
+
+
+def insert_keywords(db_connection, id_counter: IdCounter, keyword_depth: int, keyword_fan_out: int) -> Tuple[List[int], List[int], int]:
+    keywords = []
+    keyword_ids = []
+
+    root_keyword_id = id_counter.next()
+    keywords.append((root_keyword_id, genealogy_for([root_keyword_id]), None, None))
+
+    def add_children(parent_ids: List[int], label: str, depth: int):
+        for index in range(1, keyword_fan_out + 1):
+            child_label = '{}.{}'.format(label, index) if label else str(index)
+            child_id = id_counter.next()
+            child_ids = parent_ids + [child_id]
+            keywords.append((child_id, genealogy_for(child_ids), 'Keyword {}'.format(child_label), parent_ids[-1]))
+            keyword_ids.append(child_id)
+            if depth < keyword_depth:
+                add_children(child_ids, child_label, depth + 1)
+
+    add_children([root_keyword_id], '', 1)
+
+    timezone_keyword_ids = []
+    for timezone in synthetic_timezones:
+        keyword_id = id_counter.next()
+        keywords.append((keyword_id, genealogy_for([root_keyword_id, keyword_id]), 'tz-{}'.format(timezone), root_keyword_id))
+        timezone_keyword_ids.append(keyword_id)
+
+    aperture_stack_keyword_id = id_counter.next()
+    keywords.append((aperture_stack_keyword_id, genealogy_for([root_keyword_id, aperture_stack_keyword_id]), 'Aperture Stack 1',
+                     root_keyword_id))
+
+    db_connection.executemany("""INSERT INTO AgLibraryKeyword (id_local, id_global, genealogy, lc_name, name, parent)
+                                 VALUES (?, 'KEYWORD-' || ?, ?, lower(?), ?, ?)""",
+                              [(keyword_id, keyword_id, genealogy, name, name, parent) for (keyword_id, genealogy, name, parent) in keywords])
+
+    return keyword_ids, timezone_keyword_ids, aperture_stack_keyword_id
+
+
+def insert_root_folders(db_connection, id_counter: IdCounter, rng: random.Random, photos_folder: str, root_folder_count: int) -> List[dict]:
+    root_folders = []
+    for index in range(1, root_folder_count + 1):
+        root_folders.append({
+            'id': id_counter.next(),
+            'name': 'Root {}'.format(index),
+            'absolutePath': path.join(photos_folder, 'Root {}'.format(index)) + '/',
+            'folders': {}
+        })
+
+    db_connection.executemany("""INSERT INTO AgLibraryRootFolder (id_local, id_global, absolutePath, name) VALUES (?, ?, ?, ?)""",
+                              [(root_folder['id'], global_id(rng), root_folder['absolutePath'], root_folder['name'])
+                               for root_folder in root_folders])
+
+    return root_folders
+
+
+def plan_photos(rng: random.Random, photo_count: int, stack_size: int, stacked_fraction: float, aperture_stack_fraction: float,
+                edited_fraction: float, gps_fraction: float, root_folders: List[dict]) -> List[dict]:
+    photos = []
+    stack_count = 0
+
+    while len(photos) < photo_count:
+        stacked = stack_size > 1 and rng.random() < stacked_fraction
+        shot_size = min(stack_size, photo_count - len(photos)) if stacked else 1
+
+        root_folder = rng.choice(root_folders)
+        year = rng.randint(2005, 2020)
+        month = rng.randint(1, 12)
+        path_from_root = '{}/{}-{:02}/'.format(year, year, month)
+        capture_time = '{}-{:02}-{:02}T{:02}:{:02}:{:02}'.format(year, month, rng.randint(1, 28), rng.randint(0, 23),
+                                                                 rng.randint(0, 59), rng.randint(0, 59))
+        location = rng.choice(synthetic_locations) if rng.random() < gps_fraction else None
+
+        stack = None
+        if shot_size > 1:
+            stack_count += 1
+            stack = stack_count
+        aperture_stack = stack is not None and rng.random() < aperture_stack_fraction
+
+        # camera counters wrap, so base names collide across folders like they do in real catalogs
+        base_name = 'IMG_{:04}'.format(len(photos) % 10000)
+        for position in range(shot_size):
+            aperture_preview = aperture_stack and position == shot_size - 1
+            orientation = 'BC' if rng.random() < 0.1 else 'AB'
+            photos.append({
+                'root_folder': root_folder,
+                'path_from_root': path_from_root,
+                'base_name': '{}_Aperture_preview'.format(base_name) if aperture_preview else 'IMG_{:04}'.format(len(photos) % 10000),
+                'extension': 'jpg' if aperture_preview else 'CR2',
+                'capture_time': capture_time,
+                # sometimes the capture time was fixed in Lightroom and no longer matches the file
+                'exif_capture_time': capture_time if rng.random() < 0.9 else capture_time[:11] + '00:00:00',
+                'orientation': orientation,
+                'rating': rng.choice([None, 0, 1, 2, 3, 4, 5]),
+                'color_labels': 'Yellow' if rng.random() < 0.05 else '',
+                'title': 'Photo {}'.format(len(photos)) if rng.random() < 0.3 else None,
+                'location': location,
+                'edits': rng.random() < edited_fraction,
+                'stack': stack,
+                'stack_position': position,
+                'aperture_stack': aperture_stack
+            })
+
+    return photos
+
+
+def insert_photos(db_connection, id_counter: IdCounter, rng: random.Random, photos: List[dict], album_ids: List[int],
+                  albums_per_photo: int, keyword_ids: List[int], keywords_per_photo: int, timezone_keyword_ids: List[int],
+                  timezone_keyword_fraction: float, aperture_stack_keyword_id: int):
+    folders = []
+    files = []
+    images = []
+    exif_metadata = []
+    additional_metadata = []
+    develop_settings = []
+    stack_images = []
+    collection_images = []
+    keyword_images = []
+
+    stack_ids = {}
+
+    for photo in photos:
+        root_folder = photo['root_folder']
+        folder_id = root_folder['folders'].get(photo['path_from_root'])
+        if folder_id is None:
+            folder_id = id_counter.next()
+            root_folder['folders'][photo['path_from_root']] = folder_id
+            folders.append((folder_id, global_id(rng), photo['path_from_root'], root_folder['id']))
+
+        file_id = id_counter.next()
+        file_name = '{}.{}'.format(photo['base_name'], photo['extension'])
+        files.append((file_id, global_id(rng), photo['base_name'], photo['extension'], folder_id, file_name, file_name.lower(), file_name))
+
+        image_id = id_counter.next()
+        photo['id'] = image_id
+        images.append((image_id, global_id(rng), photo['capture_time'], photo['color_labels'], photo['orientation'], photo['rating'], file_id))
+
+        latitude, longitude = photo['location'] if photo['location'] is not None else (None, None)
+        exif_metadata.append((id_counter.next(), image_id, latitude, longitude, 0 if latitude is None else 1))
+
+        title = xmp_title_template.format(photo['title']) if photo['title'] is not None else ''
+        additional_metadata.append((id_counter.next(), global_id(rng), image_id, xmp_template.format(title)))
+
+        develop_settings.append((id_counter.next(), image_id, 1 if photo['edits'] else 0))
+
+        if photo['stack'] is not None:
+            stack_id = stack_ids.get(photo['stack'])
+            if stack_id is None:
+                stack_id = id_counter.next()
+                stack_ids[photo['stack']] = stack_id
+            stack_images.append((id_counter.next(), image_id, str(photo['stack_position'] + 1), stack_id))
+
+        if len(album_ids) > 0:
+            for album_id in rng.sample(album_ids, rng.randint(0, min(albums_per_photo, len(album_ids)))):
+                collection_image_id = id_counter.next()
+                collection_images.append((collection_image_id, album_id, image_id, collection_image_id))
+
+        photo_keyword_ids = rng.sample(keyword_ids, rng.randint(0, min(keywords_per_photo, len(keyword_ids))))
+        if rng.random() < timezone_keyword_fraction:
+            photo_keyword_ids.append(rng.choice(timezone_keyword_ids))
+        if photo['aperture_stack']:
+            photo_keyword_ids.append(aperture_stack_keyword_id)
+        for keyword_id in photo_keyword_ids:
+            keyword_images.append((id_counter.next(), image_id, keyword_id))
+
+    db_connection.executemany('INSERT INTO AgLibraryFolder (id_local, id_global, pathFromRoot, rootFolder) VALUES (?, ?, ?, ?)', folders)
+    db_connection.executemany("""INSERT INTO AgLibraryFile (id_local, id_global, baseName, extension, folder, idx_filename, lc_idx_filename,
+                                                            originalFilename)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", files)
+    db_connection.executemany("""INSERT INTO Adobe_images (id_local, id_global, captureTime, colorLabels, orientation, rating, rootFile)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?)""", images)
+    db_connection.executemany("""INSERT INTO AgHarvestedExifMetadata (id_local, image, gpsLatitude, gpsLongitude, hasGPS)
+                                 VALUES (?, ?, ?, ?, ?)""", exif_metadata)
+    db_connection.executemany('INSERT INTO Adobe_AdditionalMetadata (id_local, id_global, image, xmp) VALUES (?, ?, ?, ?)',
+                              additional_metadata)
+    db_connection.executemany('INSERT INTO Adobe_imageDevelopSettings (id_local, image, hasDevelopAdjustmentsEx) VALUES (?, ?, ?)',
+                              develop_settings)
+    db_connection.executemany('INSERT INTO AgLibraryFolderStackImage (id_local, image, position, stack) VALUES (?, ?, ?, ?)', stack_images)
+    db_connection.executemany("""INSERT INTO AgLibraryCollectionImage (id_local, collection, image, positionInCollection)
+                                 VALUES (?, ?, ?, ?)""", collection_images)
+    db_connection.executemany('INSERT INTO AgLibraryKeywordImage (id_local, image, tag) VALUES (?, ?, ?)', keyword_images)
+
+    db_connection.execute("""UPDATE AgLibraryCollection
+                             SET imageCount = (SELECT COUNT(*) FROM AgLibraryCollectionImage
+                                               WHERE AgLibraryCollectionImage.collection = AgLibraryCollection.id_local)""")
+    db_connection.execute("""UPDATE AgLibraryKeyword
+                             SET imageCountCache = (SELECT COUNT(*) FROM AgLibraryKeywordImage
+                                                    WHERE AgLibraryKeywordImage.tag = AgLibraryKeyword.id_local)""")
+
+
+def write_image_files(photos: List[dict], edits_folder: str):
+    for photo in photos:
+        folder = path.join(photo['root_folder']['absolutePath'], photo['path_from_root'])
+        os.makedirs(folder, exist_ok=True)
+
+        # the originals are tiny JPEGs regardless of their extension, exifread only looks at the EXIF
+        exif = exif_tiff(photo, with_image=False)
+        with open(path.join(folder, '{}.{}'.format(photo['base_name'], photo['extension'])), 'wb') as image_file:
+            image_file.write(b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(exif) + 8) + b'Exif\x00\x00' + exif + tiny_jpeg_body)
+
+        if photo['edits']:
+            edits_photo_folder = path.join(edits_folder, photo['path_from_root'])
+            os.makedirs(edits_photo_folder, exist_ok=True)
+            with open(path.join(edits_photo_folder, '{}.tif'.format(photo['base_name'])), 'wb') as image_file:
+                image_file.write(exif_tiff(photo, with_image=True))
+
+
+def exif_tiff(photo: dict, with_image: bool) -> bytes:
+    exif_date_time = photo['exif_capture_time'].replace('-', ':').replace('T', ' ')
+    image_entries = [(0x0112, tiff_short, 1, struct.pack('<H', main.lightroom_to_exif_orientation[photo['orientation']]))]
+    if with_image:
+        image_entries += [
+            (0x0100, tiff_short, 1, struct.pack('<H', 1)),  # ImageWidth
+            (0x0101, tiff_short, 1, struct.pack('<H', 1)),  # ImageLength
+            (0x0102, tiff_short, 1, struct.pack('<H', 8)),  # BitsPerSample
+            (0x0103, tiff_short, 1, struct.pack('<H', 1)),  # Compression
+            (0x0106, tiff_short, 1, struct.pack('<H', 1)),  # PhotometricInterpretation
+            (0x0115, tiff_short, 1, struct.pack('<H', 1)),  # SamplesPerPixel
+            (0x0116, tiff_short, 1, struct.pack('<H', 1)),  # RowsPerStrip
+            (0x0117, tiff_long, 1, struct.pack('<I', 1))    # StripByteCounts
+        ]
+
+    exif_entries = [(0x9003, tiff_ascii, 20, exif_date_time.encode('ascii') + b'\x00')]  # DateTimeOriginal
+
+    gps_entries = None
+    if photo['location'] is not None:
+        latitude, longitude = photo['location']
+        hour, minute, second = (int(part) for part in exif_date_time[11:].split(':'))
+        gps_entries = [
+            (0x0001, tiff_ascii, 2, (b'N' if latitude >= 0 else b'S') + b'\x00'),
+            (0x0002, tiff_rational, 3, gps_rationals(abs(latitude))),
+            (0x0003, tiff_ascii, 2, (b'E' if longitude >= 0 else b'W') + b'\x00'),
+            (0x0004, tiff_rational, 3, gps_rationals(abs(longitude))),
+            (0x0007, tiff_rational, 3, struct.pack('<6I', hour, 1, minute, 1, second, 1)),  # GPSTimeStamp
+            (0x001D, tiff_ascii, 11, exif_date_time[:10].encode('ascii') + b'\x00')          # GPSDateStamp
+        ]
+
+    # lay everything out once with placeholder pointers to learn the offsets, then again with the real pointers
+    offsets = {'exif': 0, 'gps': 0, 'strip': 0}
+    for _ in range(2):
+        ifd0_entries = image_entries + [(0x8769, tiff_long, 1, struct.pack('<I', offsets['exif']))]
+        if gps_entries is not None:
+            ifd0_entries.append((0x8825, tiff_long, 1, struct.pack('<I', offsets['gps'])))
+        if with_image:
+            ifd0_entries.append((0x0111, tiff_long, 1, struct.pack('<I', offsets['strip'])))  # StripOffsets
+
+        tiff = b'II*\x00' + struct.pack('<I', 8)
+        tiff += tiff_ifd(ifd0_entries, len(tiff))
+        offsets['exif'] = len(tiff)
+        tiff += tiff_ifd(exif_entries, len(tiff))
+        if gps_entries is not None:
+            offsets['gps'] = len(tiff)
+            tiff += tiff_ifd(gps_entries, len(tiff))
+        if with_image:
+            offsets['strip'] = len(tiff)
+            tiff += b'\x80'
+
+    return tiff
+
+
+def tiff_ifd(entries: list, offset: int) -> bytes:
+    data_offset = offset + 2 + 12 * len(entries) + 4
+    table = struct.pack('<H', len(entries))
+    data = b''
+
+    for (tag, field_type, count, value) in sorted(entries):
+        if len(value) <= 4:
+            table += struct.pack('<HHI', tag, field_type, count) + value.ljust(4, b'\x00')
+        else:
+            table += struct.pack('<HHII', tag, field_type, count, data_offset + len(data))
+            data += value
+            if len(data) % 2 == 1:
+                data += b'\x00'
+
+    return table + struct.pack('<I', 0) + data
+
+
+def gps_rationals(degrees: float) -> bytes:
+    whole_degrees = int(degrees)
+    minutes = int((degrees - whole_degrees) * 60)
+    hundredth_seconds = int(round(((degrees - whole_degrees) * 60 - minutes) * 60 * 100))
+    return struct.pack('<6I', whole_degrees, 1, minutes, 1, hundredth_seconds, 100)
+
+
+def parse_arguments(arguments: List[str]):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Lightroom catalog')
+    parser.add_argument('catalog_path')
+    parser.add_argument('--photos', type=int, default=1000)
+    parser.add_argument('--collection-depth', type=int, default=2)
+    parser.add_argument('--collection-fan-out', type=int, default=4)
+    parser.add_argument('--albums-per-photo', type=int, default=2)
+    parser.add_argument('--keyword-depth', type=int, default=2)
+    parser.add_argument('--keyword-fan-out', type=int, default=5)
+    parser.add_argument('--keywords-per-photo', type=int, default=3)
+    parser.add_argument('--stack-size', type=int, default=3)
+    parser.add_argument('--stacked-fraction', type=float, default=0.1)
+    parser.add_argument('--image-folder', help='write tiny image files with EXIF under this folder')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(arguments)
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments(sys.argv[1:])
+    summary = generate_catalog(arguments.catalog_path, photo_count=arguments.photos, collection_depth=arguments.collection_depth,
+                               collection_fan_out=arguments.collection_fan_out, albums_per_photo=arguments.albums_per_photo,
+                               keyword_depth=arguments.keyword_depth, keyword_fan_out=arguments.keyword_fan_out,
+                               keywords_per_photo=arguments.keywords_per_photo, stack_size=arguments.stack_size,
+                               stacked_fraction=arguments.stacked_fraction, image_folder=arguments.image_folder, seed=arguments.seed)
+    print('Generated {}'.format(summary))
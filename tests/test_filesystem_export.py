@@ -0,0 +1,69 @@
+import os
+from os import path
+from xml.etree import ElementTree
+
+from LightroomExport import main
+from LightroomExport import filesystem_export
+from LightroomExport.synthetic_catalog import generate_catalog
+
+
+def read_sidecar_values(sidecar_path: str, name: str) -> list:
+    prefix, local_name = name.split(':')
+    element = ElementTree.parse(sidecar_path).find('.//{{{}}}{}'.format(filesystem_export.xmp_namespaces[prefix], local_name))
+    if element is None:
+        return []
+    if len(element) == 0:
+        return [element.text]
+    return [item.text for item in element.iter('{{{}}}li'.format(filesystem_export.xmp_namespaces['rdf']))]
+
+
+def test_export_links_files_and_writes_sidecars(tmp_path):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    destination = str(tmp_path / 'export')
+    catalog_summary = generate_catalog(catalog_path, photo_count=60, image_folder=str(tmp_path))
+    edits_folders = [catalog_summary['edits_folder']]
+
+    entity_tree, photo_details, stack_details, keyword_index = main.load_catalog(catalog_path, flatten_keywords=True)
+    assert main.check_photo_files(photo_details, stack_details, edits_folders, main.lighroom_edits_extensions) == []
+    export_plans = filesystem_export.plan_exports(destination, entity_tree, photo_details, stack_details, keyword_index)
+    links = [link for export_plan in export_plans for link in export_plan['links']]
+    assert any('/Albums/' in link_destination for _, link_destination in links)
+
+    assert filesystem_export.export_catalog(catalog_path, destination, edits_folders, main.lighroom_edits_extensions, flatten_keywords=True)
+    first_inodes = {link_destination: os.stat(link_destination).st_ino for _, link_destination in links}
+
+    # a rerun finds everything already in place
+    assert filesystem_export.export_catalog(catalog_path, destination, edits_folders, main.lighroom_edits_extensions, flatten_keywords=True)
+    for source, link_destination in links:
+        assert path.samefile(source, link_destination)
+        assert os.stat(link_destination).st_ino == first_inodes[link_destination]
+        assert path.exists(link_destination + '.xmp')
+
+    favorite_plan = next(export_plan for export_plan in export_plans
+                         if export_plan['photo_info']['rating'] in filesystem_export.favorite_ratings
+                         and any(main.keyword_separator in keyword for keyword in export_plan['photo_info']['keywords']))
+    sidecar_path = favorite_plan['links'][0][1] + '.xmp'
+
+    assert read_sidecar_values(sidecar_path, 'xmp:Rating') == [str(favorite_plan['photo_info']['rating'])]
+    keywords = read_sidecar_values(sidecar_path, 'dc:subject')
+    hierarchical_keywords = read_sidecar_values(sidecar_path, 'lr:hierarchicalSubject')
+    assert filesystem_export.favorite_keyword in keywords
+    assert filesystem_export.favorite_keyword in hierarchical_keywords
+    assert any(main.keyword_separator in keyword for keyword in hierarchical_keywords)
+    assert sorted(keywords) == sorted({keyword.split(main.keyword_separator)[-1] for keyword in hierarchical_keywords})
+
+
+def test_reserve_name_treats_paths_differing_in_case_as_one():
+    taken_names = {}
+
+    assert filesystem_export.reserve_name(taken_names, '/export/Albums/Trip', 'IMG_1.jpg', 1) == '/export/Albums/Trip/IMG_1.jpg'
+    assert filesystem_export.reserve_name(taken_names, '/export/Albums/TRIP', 'img_1.JPG', 2) == '/export/Albums/TRIP/img_1 (2).JPG'
+    assert filesystem_export.reserve_name(taken_names, '/export/Albums/Other', 'IMG_1.jpg', 3) == '/export/Albums/Other/IMG_1.jpg'
+
+
+def test_export_subcommand_takes_the_catalog_and_export_arguments():
+    arguments = main.parse_arguments(['export', 'catalog.lrcat', 'destination', '--link-mode', 'symlink', '--minimum-rating', '4'])
+
+    assert (arguments.command, arguments.database_path, arguments.destination) == ('export', 'catalog.lrcat', 'destination')
+    assert (arguments.link_mode, arguments.workers) == ('symlink', filesystem_export.export_workers)
+    assert main.photo_filter_from_arguments(arguments) == {'minimum_rating': 4}
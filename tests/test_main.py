@@ -0,0 +1,257 @@
+import sys
+import types
+import shutil
+import sqlite3
+import subprocess
+from os import path
+from typing import Optional
+
+from LightroomExport import main
+from LightroomExport.synthetic_catalog import generate_catalog
+
+
+def test_lazy_apple_script_compiles_on_first_run(monkeypatch):
+    compiled_sources = []
+
+    class FakeAppleScript:
+        def __init__(self, source):
+            compiled_sources.append(source)
+
+        def run(self, *args):
+            return ('ran',) + args
+
+    monkeypatch.setitem(sys.modules, 'applescript', types.SimpleNamespace(AppleScript=FakeAppleScript))
+
+    script = main.LazyAppleScript('tell application "Photos" to activate')
+    assert compiled_sources == []
+
+    assert script.run('a', 'b') == ('ran', 'a', 'b')
+    assert script.run() == ('ran',)
+    assert compiled_sources == ['tell application "Photos" to activate']
+
+
+def test_importing_main_does_not_load_applescript_or_timezonefinder():
+    check = "import sys; from LightroomExport import main; print('applescript' in sys.modules, 'timezonefinder' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', check], cwd=path.dirname(path.dirname(path.abspath(__file__))),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ['False', 'False']
+
+
+def test_benchmark_imports_without_applescript_or_timezonefinder():
+    # a None entry in sys.modules makes the import fail, like on a machine without either package
+    check = "import sys; sys.modules['applescript'] = None; sys.modules['timezonefinder'] = None; import LightroomExport.benchmark"
+    subprocess.run([sys.executable, '-c', check], cwd=path.dirname(path.dirname(path.abspath(__file__))), check=True)
+
+
+def load_synthetic_catalog(tmp_path, photo_filter=None, **catalog_options):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    generate_catalog(catalog_path, **catalog_options)
+    return main.load_catalog(catalog_path, photo_filter)
+
+
+def planned_imports(photo_details: dict, stack_details: dict, keyword_index: dict) -> dict:
+    imports = {}
+    for photo_id in photo_details:
+        if main.prepare_photo_for_import(photo_id, photo_details, stack_details, keyword_index):
+            imports[photo_id] = sorted(photo_details[photo_id]['albums'])
+
+    return imports
+
+
+def test_filter_keeps_whole_stacks_for_aperture_decisions(tmp_path):
+    catalog_options = {'photo_count': 300, 'stacked_fraction': 0.5, 'aperture_stack_fraction': 0.5}
+    _, all_photo_details, all_stack_details, all_keyword_index = load_synthetic_catalog(tmp_path, **catalog_options)
+    all_imports = planned_imports(all_photo_details, all_stack_details, all_keyword_index)
+
+    photo_filter = {'captured_after': '2005-01-01', 'minimum_rating': 3}
+    entity_tree, photo_details, stack_details, keyword_index = load_synthetic_catalog(tmp_path, photo_filter, **catalog_options)
+    imports = planned_imports(photo_details, stack_details, keyword_index)
+
+    assert 0 < len(photo_details) < len(all_photo_details)
+    assert imports == {photo_id: albums for photo_id, albums in all_imports.items() if photo_id in photo_details}
+
+    # every album a selected photo goes into survives the pruning
+    album_names = main.get_album_names(entity_tree)
+    assert {album_id for albums in imports.values() for album_id in albums} <= set(album_names)
+
+
+def test_minimum_rating_zero_keeps_unrated_photos(tmp_path):
+    _, all_photo_details, _, _ = load_synthetic_catalog(tmp_path)
+    _, photo_details, _, _ = load_synthetic_catalog(tmp_path, {'minimum_rating': 0})
+
+    assert any(photo_info['rating'] is None for photo_info in all_photo_details.values())
+    assert set(photo_details) == set(all_photo_details)
+
+
+def touch(file_path) -> str:
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(b'')
+    return str(file_path)
+
+
+def edited_photo(file: str, stack: Optional[int] = None) -> dict:
+    return {'file': file, 'edits': True, 'stack': stack}
+
+
+def test_edits_index_scans_nested_folders_for_the_extensions(tmp_path):
+    nested_edit = touch(tmp_path / 'edits' / '2019' / 'IMG_1.TIF')
+    flat_edit = touch(tmp_path / 'edits' / 'IMG_1.tif')
+    touch(tmp_path / 'edits' / 'IMG_1.jpg')
+    psd_edit = touch(tmp_path / 'other' / 'IMG_2.psd')
+
+    edits_index = main.build_edits_index([str(tmp_path / 'edits'), str(tmp_path / 'other')], ['tif', '.PSD'])
+
+    assert edits_index == {'IMG_1': sorted([nested_edit, flat_edit]), 'IMG_2': [psd_edit]}
+
+
+def test_originals_sharing_an_edit_are_ambiguous(tmp_path):
+    touch(tmp_path / 'edits' / 'flat' / 'IMG_1.tif')
+    photo_details = {1: edited_photo('/p/2019/A/IMG_1.CR2'), 2: edited_photo('/p/2020/B/IMG_1.CR2')}
+
+    file_problems = main.resolve_edited_files(photo_details, main.build_edits_index([str(tmp_path / 'edits')], ['tif']))
+
+    assert [file_problem.split(':')[0] for file_problem in file_problems] == ['Ambiguous edits for 1', 'Ambiguous edits for 2']
+    assert photo_details[1]['edited_file'] is None
+    assert photo_details[2]['edited_file'] is None
+
+
+def test_edit_folders_break_basename_ties(tmp_path):
+    edit_a = touch(tmp_path / 'edits' / '2019' / 'A' / 'IMG_1.tif')
+    edit_b = touch(tmp_path / 'edits' / '2020' / 'B' / 'IMG_1.tif')
+    edit_c = touch(tmp_path / 'edits' / 'C' / 'IMG_2.tif')
+    photo_details = {1: edited_photo('/p/2019/A/IMG_1.CR2'), 2: edited_photo('/p/2020/B/IMG_1.CR2'),
+                     3: edited_photo('/p/2021/C/IMG_2.CR2'), 4: edited_photo('/p/2022/D/IMG_2.CR2'),
+                     5: edited_photo('/p/2021/C/IMG_2.CR2')}  # a virtual copy of 3
+
+    file_problems = main.resolve_edited_files(photo_details, main.build_edits_index([str(tmp_path / 'edits')], ['tif']))
+
+    assert [photo_details[photo_id]['edited_file'] for photo_id in range(1, 6)] == [edit_a, edit_b, edit_c, None, edit_c]
+    assert file_problems == ['Missing edits for 4: /p/2022/D/IMG_2.CR2 ({} is the edit of /p/2021/C/IMG_2.CR2)'.format(edit_c)]
+
+
+def test_check_photo_files_reports_missing_files_of_imported_photos_only(tmp_path):
+    original = touch(tmp_path / 'photos' / 'IMG_1.CR2')
+    edit = touch(tmp_path / 'edits' / 'IMG_1.tif')
+    missing_original = str(tmp_path / 'photos' / 'IMG_2.CR2')
+    skipped_original = touch(tmp_path / 'photos' / 'IMG_3.CR2')
+    aperture_preview = touch(tmp_path / 'photos' / 'IMG_3_Aperture_preview.jpg')
+    photo_details = {
+        1: edited_photo(original),
+        2: {'file': missing_original, 'edits': False, 'stack': None},
+        3: edited_photo(skipped_original, stack=10),  # has no edits on disk, but its Aperture preview is imported instead
+        4: {'file': aperture_preview, 'edits': False, 'stack': 10},
+        5: edited_photo(str(tmp_path / 'photos' / 'IMG_5.CR2'))
+    }
+    stack_details = main.get_stack_details(photo_details)
+
+    file_problems = main.check_photo_files(photo_details, stack_details, [str(tmp_path / 'edits')], ['tif'])
+
+    assert sorted(file_problems) == sorted(['Missing edits for 5: {}'.format(photo_details[5]['file']),
+                                            'Missing file {}'.format(missing_original),
+                                            'Missing file {}'.format(photo_details[5]['file'])])
+    assert photo_details[1]['edited_file'] == edit
+    assert 'edited_file' not in photo_details[3]
+
+
+def read_catalog_rows(catalog_path: str, query: str, parameters=()) -> list:
+    with sqlite3.connect(catalog_path) as db_connection:
+        return list(db_connection.execute(query, parameters))
+
+
+def keyword_index_for(catalog_path: str, flatten_keywords: bool = False) -> dict:
+    with sqlite3.connect(catalog_path) as db_connection:
+        return main.read_keyword_index(db_connection, flatten_keywords=flatten_keywords)
+
+
+def test_keyword_names_follow_the_genealogy_and_flatten(tmp_path):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    generate_catalog(catalog_path, photo_count=20)
+
+    # a child stored ahead of its parent still comes after it
+    [(root_keyword_id, root_genealogy)] = read_catalog_rows(catalog_path, 'SELECT id_local, genealogy FROM AgLibraryKeyword WHERE name IS NULL')
+    parent_id, child_id = 9000002, 9000001
+    parent_genealogy = root_genealogy + '/7{}'.format(parent_id)
+    with sqlite3.connect(catalog_path) as db_connection:
+        db_connection.executemany('INSERT INTO AgLibraryKeyword (id_local, id_global, genealogy, lc_name, name, parent) VALUES (?, ?, ?, ?, ?, ?)',
+                                  [(child_id, 'CHILD', parent_genealogy + '/7{}'.format(child_id), 'early child', 'Early Child', parent_id),
+                                   (parent_id, 'PARENT', parent_genealogy, 'late parent', 'Late Parent', root_keyword_id)])
+
+    keyword_index = keyword_index_for(catalog_path, flatten_keywords=True)
+    positions = keyword_index['positions']
+    for (keyword_id, parent) in read_catalog_rows(catalog_path, 'SELECT id_local, parent FROM AgLibraryKeyword WHERE parent IS NOT NULL'):
+        assert positions[parent] < positions[keyword_id]
+
+    export_names = set(keyword_index['export_names'])
+    assert {'Late Parent', 'Late Parent|Early Child', 'Keyword 1', 'Keyword 1|Keyword 1.2'} <= export_names
+    assert 'Early Child' not in export_names
+
+    keyword_index = keyword_index_for(catalog_path)
+    assert keyword_index['export_names'][keyword_index['positions'][child_id]] == 'Early Child'
+
+
+def test_aperture_stack_keywords_are_left_out(tmp_path):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    generate_catalog(catalog_path, photo_count=200, stacked_fraction=0.5, aperture_stack_fraction=0.5)
+    tagged_photos = read_catalog_rows(catalog_path, """SELECT AgLibraryKeywordImage.image
+                                                      FROM AgLibraryKeywordImage
+                                                      JOIN AgLibraryKeyword ON AgLibraryKeyword.id_local = AgLibraryKeywordImage.tag
+                                                      WHERE AgLibraryKeyword.name LIKE 'Aperture Stack %'""")
+
+    _, photo_details, _, keyword_index = main.load_catalog(catalog_path)
+
+    assert len(tagged_photos) > 0
+    for (photo_id,) in tagged_photos:
+        keywords = main.keyword_names_for_photo(photo_details[photo_id], keyword_index)
+        assert not any(keyword.startswith('Aperture Stack ') for keyword in keywords)
+
+
+def test_single_timezone_keyword_is_used_and_removed_only_when_suspect(tmp_path):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    generate_catalog(catalog_path, photo_count=20, gps_fraction=1.0, timezone_keyword_fraction=1.0, image_folder=str(tmp_path))
+    timezone_keywords = dict(read_catalog_rows(catalog_path, """SELECT AgLibraryKeywordImage.image, AgLibraryKeyword.name
+                                                               FROM AgLibraryKeywordImage
+                                                               JOIN AgLibraryKeyword ON AgLibraryKeyword.id_local = AgLibraryKeywordImage.tag
+                                                               WHERE AgLibraryKeyword.name LIKE 'tz-%'"""))
+
+    _, photo_details, stack_details, keyword_index = main.load_catalog(catalog_path)
+
+    assert keyword_index['photo_timezones'] == {photo_id: name[3:] for photo_id, name in timezone_keywords.items()}
+    photo_id = next(photo_id for photo_id, photo_info in photo_details.items()
+                    if photo_info['file'].endswith('.CR2') and photo_info['stack'] is None and photo_info['edits'] is False)
+    timezone_keyword = timezone_keywords[photo_id]
+    assert main.prepare_photo_for_import(photo_id, photo_details, stack_details, keyword_index)
+    assert timezone_keyword in photo_details[photo_id]['keywords']
+
+    # the same image with GPS time under a name that isn't a CR2 has a trustworthy timezone
+    trusted_file = str(tmp_path / 'trusted.jpg')
+    shutil.copy(photo_details[photo_id]['file'], trusted_file)
+    trusted_info = {**photo_details[photo_id], 'file': trusted_file, 'keywords': list(photo_details[photo_id]['keywords'])}
+    main.generate_photo_metadata(trusted_info)
+    assert timezone_keyword in trusted_info['keywords']
+
+    suspect_info = photo_details[photo_id]
+    main.generate_photo_metadata(suspect_info)
+    assert timezone_keyword not in suspect_info['keywords']
+    assert suspect_info['timezone'] == timezone_keyword[3:]
+
+
+def test_multiple_timezone_keywords_leave_the_timezone_unset(tmp_path, capsys):
+    catalog_path = str(tmp_path / 'synthetic.lrcat')
+    generate_catalog(catalog_path, photo_count=20)
+    timezone_keyword_ids = [keyword_id for (keyword_id,) in read_catalog_rows(catalog_path, "SELECT id_local FROM AgLibraryKeyword WHERE name LIKE 'tz-%'")]
+    photo_id = read_catalog_rows(catalog_path, 'SELECT MIN(id_local) FROM Adobe_images')[0][0]
+    with sqlite3.connect(catalog_path) as db_connection:
+        db_connection.executemany('INSERT INTO AgLibraryKeywordImage (id_local, image, tag) VALUES (?, ?, ?)',
+                                  [(9000000 + index, photo_id, keyword_id) for index, keyword_id in enumerate(timezone_keyword_ids[:2])])
+
+    _, photo_details, stack_details, keyword_index = main.load_catalog(catalog_path)
+    photo_info = photo_details[photo_id]
+
+    assert photo_id not in keyword_index['photo_timezones']
+    assert photo_info['keyword_timezone'] is None
+    assert photo_info['multiple_timezone_keywords'] is True
+    assert 'Multiple timezone keywords' not in capsys.readouterr().out
+
+    photo_info['keywords'] = main.keyword_names_for_photo(photo_info, keyword_index)
+    assert main.extract_timezone_from_keywords(photo_info) is None
+    assert 'Multiple timezone keywords' in capsys.readouterr().out